@@ -4,116 +4,538 @@ Implements the complete command set with inline keyboard support
 """
 
 import os
+import time
 import asyncio
+import logging
+import aiofiles.os
+from functools import partial
+from html import escape
+from types import MappingProxyType
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile
 from telegram.ext import ContextTypes
-from telegram.constants import ParseMode
+from telegram.error import BadRequest, TelegramError
 
 from config import *
 from bot.keyboards import *
-from bot.storage import get_user_storage
+from bot.storage import GLOBAL_STORAGE, get_user_storage
 from utils.file_processor import FileProcessor
 from utils.template_engine import TemplateEngine
 from utils.banner_manager import BannerManager
 
+logger = logging.getLogger(__name__)
+
+# Static Responses
+
+AUTORENAME_TEXT = (
+    "🔧 <b>Auto-Rename Template Setup</b>\n\n"
+    "Create a custom template using variables:\n"
+    "• {title} - File title\n"
+    "• {season} - Season number\n"
+    "• {episode} - Episode number\n"
+    "• {audio} - Audio format\n"
+    "• {quality} - Video quality\n"
+    "• {volume} - Volume info\n"
+    "• {chapter} - Chapter number\n\n"
+    "Example: <code>S{season} E{episode} - {title} [{audio}] {quality}</code>"
+)
+
+MODE_TEXT = (
+    "📝 <b>Select Rename Mode</b>\n\n"
+    "• <b>Autorename</b> - Use your predefined template\n"
+    "• <b>Manual</b> - Enter custom name for each file\n"
+    "• <b>Replace</b> - Replace specific text in filenames"
+)
+
+THUMBNAIL_MODE_TEXT = (
+    "📷 <b>Thumbnail Mode Selection</b>\n\n"
+    "• <b>Normal</b> - Single thumbnail for all files\n"
+    "• <b>Season</b> - Separate thumbnails per season (s01-s10)\n"
+    "• <b>Quality</b> - Thumbnails by quality (144p-8000p)\n\n"
+    "Choose your preferred thumbnail management mode:"
+)
+
+CAPTION_MODE_TEXT = (
+    "💬 <b>Caption Formatting Options</b>\n\n"
+    "Select how you want your file captions to be formatted:"
+)
+
+METADATA_TEXT = (
+    "📋 <b>Metadata Editor</b>\n\n"
+    "Configure metadata fields for your files:\n"
+    "• Title\n"
+    "• Author\n"
+    "• Artist\n"
+    "• Subtitle\n"
+    "• Audio\n"
+    "• Video\n\n"
+    "Use the buttons below to edit metadata:"
+)
+
+SETMEDIATYPE_TEXT = (
+    "📱 <b>Set Media Type</b>\n\n"
+    "Choose the output media type for your files:"
+)
+
+GETTHUMB_TEXT = (
+    "🖼️ <b>Thumbnail Extractor</b>\n\n"
+    "Send me a media file and I'll extract its thumbnail for you.\n"
+    "Supported formats: Video, Audio, Documents"
+)
+
+DELDUMP_TEXT = (
+    "🗑️ <b>Delete Dump Files</b>\n\n"
+    "This will permanently delete all dump files and clear dump data.\n"
+    "Are you sure you want to proceed?"
+)
+
+REPLACE_TEXT = (
+    "🔄 <b>Text Replacement Setup</b>\n\n"
+    "Set up text replacement rules for automatic file renaming.\n\n"
+    "<b>Usage:</b> <code>/replace old_text | new_text</code>\n"
+    "<b>Example:</b> <code>/replace .mkv | .mp4</code>"
+)
+
+REPLACE_INVALID_TEXT = "❌ Invalid format. Use: <code>/replace old_text | new_text</code>"
+
+NO_TEMPLATE_TEXT = "❌ No template set. Use /autorename to create one first."
+
+LEADERBOARD_EMPTY_TEXT = (
+    "📊 <b>Leaderboard</b>\n\n"
+    "No data available yet. Start renaming files to appear on the leaderboard!"
+)
+
+TOP_REFERRALS_EMPTY_TEXT = (
+    "🎯 <b>Top Referrals</b>\n\n"
+    "No referral data available yet. Use /refer to start earning referral rewards!"
+)
+
+ELITES_EMPTY_TEXT = (
+    "👑 <b>Elite Premium Users</b>\n\n"
+    "No premium users yet. Be the first to join the elite club!"
+)
+
+ADMIN_DENIED_TEXT = "❌ Access denied. Admin only command."
+
+ADMIN_TEXT = (
+    "🔐 <b>Admin Control Panel</b>\n\n"
+    "Welcome to the admin interface."
+)
+
+BACK_TEXT = "🔙 Returned to main menu"
+
+COMING_SOON_TEXT = "⚠️ Feature coming soon!"
+
+FEATURES_TEXT = """
+🚀 <b>Bot Features Overview</b>
+
+<b>🔧 Rename System:</b>
+• Auto-rename with custom templates
+• Manual rename mode
+• Text replacement rules
+• Variable support
+
+<b>🎨 Customization:</b>
+• Banner control panel
+• Thumbnail management (Normal/Season/Quality)
+• Caption formatting (11 styles)
+• Metadata editing
+
+<b>📁 File Support:</b>
+• Up to 5GB file size
+• All media formats
+• Document processing
+• Thumbnail extraction
+
+<b>💎 Premium Features:</b>
+• Unlimited processing
+• Priority queue
+• Advanced analytics
+• API access
+
+<b>🎯 Social Features:</b>
+• Referral system
+• Leaderboards
+• Premium community
+• Elite status
+
+<b>🛠️ Advanced:</b>
+• Dump management
+• Batch processing
+• Progress tracking
+• Admin controls
+"""
+
+ABOUT_TEXT = """
+🤖 <b>About Auto Renamer Bot</b>
+
+<b>Version:</b> 2.0.0
+<b>Developer:</b> @AutoRenamerBot
+<b>Support:</b> @AutoRenamerSupport
+
+<b>Statistics:</b>
+• Files processed: 1M+
+• Active users: 50K+
+• Premium members: 5K+
+• Uptime: 99.9%
+
+<b>Features:</b>
+• 26+ Commands
+• Inline keyboard interface
+• 5GB file support
+• Advanced templates
+• Premium system
+
+<b>Links:</b>
+• Channel: @AutoRenamerChannel
+• Support: @AutoRenamerSupport
+• Updates: @AutoRenamerNews
+
+Thank you for using our bot! ❤️
+"""
+
+SETTINGS_TEMPLATE = """
+⚙️ <b>Your Current Settings</b>
+
+<b>Rename Mode:</b> {rename_mode}
+<b>Template:</b> {template}
+<b>Thumbnail Mode:</b> {thumbnail_mode}
+<b>Caption Mode:</b> {caption_mode}
+<b>Banner Status:</b> {banner_status}
+<b>Premium Status:</b> {premium_status}
+
+Use the buttons below to modify your settings.
+"""
+
+BANNER_TEMPLATE = """
+🎨 <b>Banner Control Panel</b>
+
+<b>STATUS:</b> {banner_status}
+<b>IMAGE:</b> {banner_image}
+<b>POSITION:</b> {banner_position}
+<b>LINK:</b> {banner_link}
+
+Use the buttons below to configure your banner settings.
+Banner will be added to PDF files and other supported formats.
+"""
+
+DUMP_SETTINGS_TEMPLATE = """
+📤 <b>Dump Settings</b>
+
+<b>File-dump:</b> {dump_status}
+<b>Dump Channel:</b> {dump_channel}
+<b>Forwarding Mode:</b> {forwarding_mode}
+
+Configure how processed files are handled and stored.
+"""
+
+PREMIUM_ACTIVE_TEMPLATE = """
+💎 <b>Premium Status: Active</b>
+
+<b>Valid Until:</b> {premium_until}
+
+<b>Your Premium Features:</b>
+✅ Unlimited file renames
+✅ Priority processing queue
+✅ Custom thumbnail uploads
+✅ Advanced analytics
+✅ API access
+✅ No watermarks
+✅ Premium support
+
+Thank you for being a premium member!
+"""
+
+PREMIUM_INACTIVE_TEXT = f"""
+💎 <b>Premium Membership</b>
+
+<b>Premium Features:</b>
+• Unlimited file renames
+• Priority processing queue
+• Custom thumbnail uploads
+• Advanced analytics
+• API access
+• No watermarks
+• Premium support
+
+<b>Get Premium:</b>
+• Monthly: $4.99
+• Yearly: $49.99 (Save 17%)
+• Lifetime: $99.99
+
+<b>Free Ways to Get Premium:</b>
+• Refer friends (+{REFERRAL_BONUS_HOURS} hours each)
+• Top leaderboard positions
+• Community contributions
+"""
+
+REFER_TEMPLATE = f"""
+🎁 <b>Refer Friends &amp; Earn Premium</b>
+
+<b>Your Referral Link:</b>
+<code>{{referral_link}}</code>
+
+<b>Rewards:</b>
+• +{REFERRAL_BONUS_HOURS} hours premium access per referral
+• +{REFERRAL_POINTS_PER_USER} points per new user
+• Exclusive features for top referrers
+
+Share your link with friends to start earning!
+"""
+
+PREVIEW_TEMPLATE = (
+    "🔍 <b>Template Preview</b>\n\n"
+    "<b>Template:</b> <code>{template}</code>\n"
+    "<b>Preview:</b> <code>{preview}</code>\n\n"
+    "This is how your files will be renamed."
+)
+
+REPLACE_SET_TEMPLATE = (
+    "✅ <b>Replace Rule Set</b>\n\n"
+    "<b>Replace:</b> <code>{old_text}</code>\n"
+    "<b>With:</b> <code>{new_text}</code>\n\n"
+    "This rule will be applied to all file renames."
+)
+
+RENAMED_CAPTION_TEMPLATE = "✅ Renamed: <code>{new_name}</code>"
+
+# Display values for settings that are missing from storage
+_SETTINGS_DEFAULTS = MappingProxyType({
+    'rename_mode': 'autorename',
+    'template': 'Not set',
+    'thumbnail_mode': 'normal',
+    'caption_mode': 'Normal',
+    'banner_enabled': False,
+    'banner_image': 'None set',
+    'banner_position': 'START',
+    'banner_link': 'None set',
+    'dump_enabled': False,
+    'dump_channel': 'Not set',
+    'forwarding_mode': 'Disabled',
+    'is_premium': False,
+    'premium_until': None,
+})
+
+_ENABLED_LABELS = ("Disabled", "Enabled")
+_PREMIUM_LABELS = ("Free", "Active")
+
+# Rank prefixes for the top-10 lists and tier icons for the elites list
+_MEDALS = ("🥇", "🥈", "🥉") + tuple(f"{i}." for i in range(4, 11))
+_TIER_ICONS = {"lifetime": "👑", "yearly": "💎"}
+
+class _SettingsView(dict):
+    """Settings mapping that resolves missing keys to display defaults"""
+    
+    def __missing__(self, key):
+        return _SETTINGS_DEFAULTS[key]
+
+class _EscapedView(_SettingsView):
+    """Settings view whose values are HTML-escaped for the message templates"""
+    
+    def __getitem__(self, key):
+        return escape(str(super().__getitem__(key)))
+
+# Values used on every /start and button press, bound once at module scope
+_START_MSG = MESSAGES["start"]
+_ERROR_FMT = MESSAGES["error"].format
+_REFER_FMT = REFER_TEMPLATE.format
+_PREMIUM_ACTIVE_FMT = PREMIUM_ACTIVE_TEMPLATE.format
+_PREVIEW_FMT = PREVIEW_TEMPLATE.format
+_REPLACE_SET_FMT = REPLACE_SET_TEMPLATE.format
+_RENAMED_CAPTION_FMT = RENAMED_CAPTION_TEMPLATE.format
+
+# Text and keyboard pairs for commands whose response never varies,
+# built once at import so handlers only send them
+_STATIC_RESPONSES = MappingProxyType({
+    "help": (MESSAGES["help"], get_help_keyboard()),
+    "autorename": (AUTORENAME_TEXT, get_autorename_keyboard()),
+    "mode": (MODE_TEXT, get_mode_keyboard()),
+    "thumbnail_mode": (THUMBNAIL_MODE_TEXT, get_thumbnail_mode_keyboard()),
+    "caption_mode": (CAPTION_MODE_TEXT, get_caption_mode_keyboard()),
+    "metadata": (METADATA_TEXT, get_metadata_keyboard()),
+    "setmediatype": (SETMEDIATYPE_TEXT, get_mediatype_keyboard()),
+    "getthumb": (GETTHUMB_TEXT, get_back_keyboard()),
+    "deldump": (DELDUMP_TEXT, get_delete_dump_keyboard()),
+    "features": (FEATURES_TEXT, get_features_keyboard()),
+    "about": (ABOUT_TEXT, get_about_keyboard()),
+    "replace": (REPLACE_TEXT, get_replace_keyboard()),
+    "replace_invalid": (REPLACE_INVALID_TEXT, None),
+    "no_template": (NO_TEMPLATE_TEXT, get_back_keyboard()),
+    "leaderboard_empty": (LEADERBOARD_EMPTY_TEXT, get_back_keyboard()),
+    "top_referrals_empty": (TOP_REFERRALS_EMPTY_TEXT, get_back_keyboard()),
+    "elites_empty": (ELITES_EMPTY_TEXT, get_back_keyboard()),
+    "admin_denied": (ADMIN_DENIED_TEXT, None),
+    "admin": (ADMIN_TEXT, get_admin_keyboard()),
+})
+
+async def _reply_static(update: Update, key: str):
+    """Send a precomputed static response"""
+    text, keyboard = _STATIC_RESPONSES[key]
+    await update.message.reply_text(
+        text,
+        reply_markup=keyboard
+    )
+
+# Per-update User Context
+
+async def prime_user_context(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Bind the user's storage to context.user_data before the command handlers run"""
+    if update.effective_user is None:
+        return
+    
+    user_data = context.user_data
+    # Re-fetched every update so user_data never pins an instance evicted from the storage cache
+    user_data["_storage"] = get_user_storage(update.effective_user.id)
+    
+    # Settings are fetched lazily and only reused within a single update
+    user_data.pop("_settings", None)
+
+def _user_storage(context: ContextTypes.DEFAULT_TYPE):
+    """Storage bound to the current user by prime_user_context"""
+    return context.user_data["_storage"]
+
+def _user_settings(context: ContextTypes.DEFAULT_TYPE) -> dict:
+    """Settings for the current update, read from storage at most once"""
+    settings = context.user_data.get("_settings")
+    if settings is None:
+        settings = context.user_data["_settings"] = _user_storage(context).get_user_settings()
+    return settings
+
+# Rendered leaderboard texts, keyed by list name: (time rendered, text)
+_LIST_TEXT_CACHE = {}
+
+def _get_list_text(name: str):
+    """Rendered list text if it is younger than LEADERBOARD_CACHE_TTL"""
+    entry = _LIST_TEXT_CACHE.get(name)
+    if entry and time.monotonic() - entry[0] < LEADERBOARD_CACHE_TTL:
+        return entry[1]
+    return None
+
+def _set_list_text(name: str, text: str) -> str:
+    """Store a rendered list text in the TTL cache"""
+    _LIST_TEXT_CACHE[name] = (time.monotonic(), text)
+    return text
+
+# Rendered texts go stale together with the query results they were built from
+GLOBAL_STORAGE.add_invalidation_listener(lambda name: _LIST_TEXT_CACHE.pop(name, None))
+
+def _ranked_lines(title: str, entries, unit: str) -> str:
+    """Title followed by one medal-prefixed line per (user_id, username, count) entry"""
+    return title + "\n".join(
+        f"{medal} {escape(username)}: {count} {unit}"
+        for medal, (_, username, count) in zip(_MEDALS, entries)
+    )
+
+async def _throttled_edit(message, last_edit: float, text: str, **kwargs):
+    """Edit a message, waiting until EDIT_INTERVAL has passed since last_edit"""
+    delay = last_edit + EDIT_INTERVAL - time.monotonic()
+    if delay > 0:
+        await asyncio.sleep(delay)
+    await message.edit_text(text, **kwargs)
+
+# Renamed files are read fully into memory before upload, so only a few may be in flight
+_UPLOAD_SEMAPHORE = asyncio.Semaphore(MAX_CONCURRENT_UPLOADS)
+
+# Bursts of uploads queue here instead of all downloading and processing at once
+_FILE_SEMAPHORE = asyncio.Semaphore(MAX_CONCURRENT_FILES)
+
+# Set once Telegram rejects START_PHOTO so later /start calls go straight to text
+_START_PHOTO_REJECTED = False
+
+# Telegram's file_id for START_PHOTO after the first upload, so the URL is fetched only once
+_START_PHOTO_FILE_ID = None
+_START_PHOTO_LOCK = asyncio.Lock()
+
+async def _send_start_photo(message):
+    """Send the welcome photo, uploading it from START_PHOTO only on first use"""
+    global _START_PHOTO_FILE_ID
+    
+    if _START_PHOTO_FILE_ID is None:
+        async with _START_PHOTO_LOCK:
+            if _START_PHOTO_FILE_ID is None:
+                sent = await message.reply_photo(
+                    photo=START_PHOTO,
+                    caption=_START_MSG,
+                    reply_markup=MAIN_MENU_KB
+                )
+                _START_PHOTO_FILE_ID = sent.photo[-1].file_id
+                return
+    
+    await message.reply_photo(
+        photo=_START_PHOTO_FILE_ID,
+        caption=_START_MSG,
+        reply_markup=MAIN_MENU_KB
+    )
+
+# Telegram's error texts when START_PHOTO itself cannot be used, e.g. "Wrong file
+# identifier/http url specified" or "Failed to get http url content"
+_PHOTO_ERROR_HINTS = ("url", "file", "photo", "image", "web page content")
+
+def _is_start_photo_error(error: TelegramError) -> bool:
+    """Whether Telegram rejected the photo itself, rather than the chat or the request"""
+    if not isinstance(error, BadRequest):
+        return False
+    text = error.message.lower()
+    return any(hint in text for hint in _PHOTO_ERROR_HINTS)
+
 # Command Handlers
 
 async def start_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command with welcome image and inline keyboard"""
+    global _START_PHOTO_REJECTED
     user = update.effective_user
-    storage = get_user_storage(user.id)
     
     # Initialize user if new
-    if not storage.get_user_settings():
-        storage.initialize_user(user.id, user.first_name or "User")
+    if not _user_settings(context):
+        _user_storage(context).initialize_user(user.id, user.first_name or "User")
+        context.user_data.pop("_settings", None)
     
     # Send welcome image if configured
-    if START_PHOTO and START_PHOTO.startswith("http"):
+    if START_PHOTO and START_PHOTO.startswith("http") and not _START_PHOTO_REJECTED:
         try:
-            await update.message.reply_photo(
-                photo=START_PHOTO,
-                caption=MESSAGES["start"],
-                reply_markup=get_main_menu_keyboard(),
-                parse_mode=ParseMode.MARKDOWN
-            )
-        except:
+            await _send_start_photo(update.message)
+        except TelegramError as e:
+            # A rejected URL will keep failing; other errors may not be about the photo
+            if _is_start_photo_error(e):
+                _START_PHOTO_REJECTED = True
+            logger.warning(f"Could not send START_PHOTO: {e}")
+            
             # Fallback to text if image fails
             await update.message.reply_text(
-                MESSAGES["start"],
-                reply_markup=get_main_menu_keyboard(),
-                parse_mode=ParseMode.MARKDOWN
+                _START_MSG,
+                reply_markup=MAIN_MENU_KB
             )
     else:
         await update.message.reply_text(
-            MESSAGES["start"],
-            reply_markup=get_main_menu_keyboard(),
-            parse_mode=ParseMode.MARKDOWN
+            _START_MSG,
+            reply_markup=MAIN_MENU_KB
         )
 
 async def help_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /help command"""
-    await update.message.reply_text(
-        MESSAGES["help"],
-        reply_markup=get_help_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
-    )
+    await _reply_static(update, "help")
 
 async def settings_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /settings command"""
-    user = update.effective_user
-    storage = get_user_storage(user.id)
-    settings = storage.get_user_settings()
-    
-    settings_text = f"""
-⚙️ **Your Current Settings**
-
-**Rename Mode:** {settings.get('rename_mode', 'autorename')}
-**Template:** {settings.get('template', 'Not set')}
-**Thumbnail Mode:** {settings.get('thumbnail_mode', 'normal')}
-**Caption Mode:** {settings.get('caption_mode', 'Normal')}
-**Banner Status:** {'Enabled' if settings.get('banner_enabled') else 'Disabled'}
-**Premium Status:** {'Active' if settings.get('is_premium') else 'Free'}
-
-Use the buttons below to modify your settings.
-"""
+    settings = _SettingsView(_user_settings(context))
+    settings['banner_status'] = _ENABLED_LABELS[bool(settings['banner_enabled'])]
+    settings['premium_status'] = _PREMIUM_LABELS[bool(settings['is_premium'])]
     
     await update.message.reply_text(
-        settings_text,
-        reply_markup=get_settings_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
+        SETTINGS_TEMPLATE.format_map(_EscapedView(settings)),
+        reply_markup=SETTINGS_KB
     )
 
 # Rename System Handlers
 
 async def autorename_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /autorename command"""
-    await update.message.reply_text(
-        "🔧 **Auto-Rename Template Setup**\n\n"
-        "Create a custom template using variables:\n"
-        "• {title} - File title\n"
-        "• {season} - Season number\n"
-        "• {episode} - Episode number\n"
-        "• {audio} - Audio format\n"
-        "• {quality} - Video quality\n"
-        "• {volume} - Volume info\n"
-        "• {chapter} - Chapter number\n\n"
-        "Example: `S{season} E{episode} - {title} [{audio}] {quality}`",
-        reply_markup=get_autorename_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
-    )
+    await _reply_static(update, "autorename")
 
 async def preview_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /preview command"""
-    user = update.effective_user
-    storage = get_user_storage(user.id)
-    settings = storage.get_user_settings()
-    
-    template = settings.get('template', 'Not set')
+    template = _user_storage(context).get_setting('template', 'Not set')
     if template == 'Not set':
-        await update.message.reply_text(
-            "❌ No template set. Use /autorename to create one first.",
-            reply_markup=get_back_keyboard()
-        )
+        await _reply_static(update, "no_template")
         return
     
     # Generate preview with sample data
@@ -131,443 +553,192 @@ async def preview_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     preview = engine.apply_template(template, sample_data)
     
     await update.message.reply_text(
-        f"🔍 **Template Preview**\n\n"
-        f"**Template:** `{template}`\n"
-        f"**Preview:** `{preview}`\n\n"
-        f"This is how your files will be renamed.",
-        reply_markup=get_preview_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
+        _PREVIEW_FMT(template=escape(template), preview=escape(preview)),
+        reply_markup=PREVIEW_KB
     )
 
 async def mode_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /mode command"""
-    await update.message.reply_text(
-        "📝 **Select Rename Mode**\n\n"
-        "• **Autorename** - Use your predefined template\n"
-        "• **Manual** - Enter custom name for each file\n"
-        "• **Replace** - Replace specific text in filenames",
-        reply_markup=get_mode_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
-    )
+    await _reply_static(update, "mode")
 
 async def replace_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /replace command"""
     if context.args and len(context.args) >= 1:
-        # Parse replace arguments
-        arg_text = " ".join(context.args)
-        if "|" in arg_text:
-            old_text, new_text = arg_text.split("|", 1)
-            old_text = old_text.strip()
-            new_text = new_text.strip()
+        # Parse replace arguments; only join them once a separator is present
+        if any("|" in arg for arg in context.args):
+            old_text, _, new_text = " ".join(context.args).partition("|")
+            old_text, new_text = old_text.strip(), new_text.strip()
             
-            user = update.effective_user
-            storage = get_user_storage(user.id)
-            storage.set_replace_rule(old_text, new_text)
+            _user_storage(context).set_replace_rule(old_text, new_text)
             
             await update.message.reply_text(
-                f"✅ **Replace Rule Set**\n\n"
-                f"**Replace:** `{old_text}`\n"
-                f"**With:** `{new_text}`\n\n"
-                f"This rule will be applied to all file renames.",
-                parse_mode=ParseMode.MARKDOWN
+                _REPLACE_SET_FMT(old_text=escape(old_text), new_text=escape(new_text))
             )
         else:
-            await update.message.reply_text(
-                "❌ Invalid format. Use: `/replace old_text | new_text`",
-                parse_mode=ParseMode.MARKDOWN
-            )
+            await _reply_static(update, "replace_invalid")
     else:
-        await update.message.reply_text(
-            "🔄 **Text Replacement Setup**\n\n"
-            "Set up text replacement rules for automatic file renaming.\n\n"
-            "**Usage:** `/replace old_text | new_text`\n"
-            "**Example:** `/replace .mkv | .mp4`",
-            reply_markup=get_replace_keyboard(),
-            parse_mode=ParseMode.MARKDOWN
-        )
+        await _reply_static(update, "replace")
 
 # Banner and Customization Handlers
 
 async def banner_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /banner command - Banner Control Panel"""
-    user = update.effective_user
-    storage = get_user_storage(user.id)
-    settings = storage.get_user_settings()
-    
-    banner_status = "Enabled" if settings.get('banner_enabled') else "Disabled"
-    banner_image = settings.get('banner_image', 'None set')
-    banner_position = settings.get('banner_position', 'START')
-    banner_link = settings.get('banner_link', 'None set')
-    
-    banner_text = f"""
-🎨 **Banner Control Panel**
-
-**STATUS:** {banner_status}
-**IMAGE:** {banner_image}
-**POSITION:** {banner_position}
-**LINK:** {banner_link}
-
-Use the buttons below to configure your banner settings.
-Banner will be added to PDF files and other supported formats.
-"""
+    settings = _SettingsView(_user_settings(context))
+    settings['banner_status'] = _ENABLED_LABELS[bool(settings['banner_enabled'])]
     
     await update.message.reply_text(
-        banner_text,
-        reply_markup=get_banner_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
+        BANNER_TEMPLATE.format_map(_EscapedView(settings)),
+        reply_markup=BANNER_KB
     )
 
 async def thumbnail_mode_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /thumbnail_mode command"""
-    await update.message.reply_text(
-        "📷 **Thumbnail Mode Selection**\n\n"
-        "• **Normal** - Single thumbnail for all files\n"
-        "• **Season** - Separate thumbnails per season (s01-s10)\n"
-        "• **Quality** - Thumbnails by quality (144p-8000p)\n\n"
-        "Choose your preferred thumbnail management mode:",
-        reply_markup=get_thumbnail_mode_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
-    )
+    await _reply_static(update, "thumbnail_mode")
 
 async def caption_mode_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /caption_mode command"""
-    await update.message.reply_text(
-        "💬 **Caption Formatting Options**\n\n"
-        "Select how you want your file captions to be formatted:",
-        reply_markup=get_caption_mode_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
-    )
+    await _reply_static(update, "caption_mode")
 
 # File and Metadata Handlers
 
 async def metadata_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /metadata command"""
-    await update.message.reply_text(
-        "📋 **Metadata Editor**\n\n"
-        "Configure metadata fields for your files:\n"
-        "• Title\n"
-        "• Author\n"
-        "• Artist\n"
-        "• Subtitle\n"
-        "• Audio\n"
-        "• Video\n\n"
-        "Use the buttons below to edit metadata:",
-        reply_markup=get_metadata_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
-    )
+    await _reply_static(update, "metadata")
 
 async def setmediatype_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /setmediatype command"""
-    await update.message.reply_text(
-        "📱 **Set Media Type**\n\n"
-        "Choose the output media type for your files:",
-        reply_markup=get_mediatype_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
-    )
+    await _reply_static(update, "setmediatype")
 
 async def getthumb_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /getthumb command"""
-    await update.message.reply_text(
-        "🖼️ **Thumbnail Extractor**\n\n"
-        "Send me a media file and I'll extract its thumbnail for you.\n"
-        "Supported formats: Video, Audio, Documents",
-        reply_markup=get_back_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
-    )
+    await _reply_static(update, "getthumb")
 
 # Dump Management Handlers
 
 async def dumpsettings_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /dumpsettings command"""
-    user = update.effective_user
-    storage = get_user_storage(user.id)
-    settings = storage.get_user_settings()
-    
-    dump_enabled = settings.get('dump_enabled', False)
-    dump_channel = settings.get('dump_channel', 'Not set')
-    forwarding_mode = settings.get('forwarding_mode', 'Disabled')
-    
-    dump_text = f"""
-📤 **Dump Settings**
-
-**File-dump:** {'Enabled' if dump_enabled else 'Disabled'}
-**Dump Channel:** {dump_channel}
-**Forwarding Mode:** {forwarding_mode}
-
-Configure how processed files are handled and stored.
-"""
+    settings = _SettingsView(_user_settings(context))
+    settings['dump_status'] = _ENABLED_LABELS[bool(settings['dump_enabled'])]
     
     await update.message.reply_text(
-        dump_text,
-        reply_markup=get_dump_settings_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
+        DUMP_SETTINGS_TEMPLATE.format_map(_EscapedView(settings)),
+        reply_markup=DUMP_SETTINGS_KB
     )
 
 async def deldump_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /deldump command"""
-    await update.message.reply_text(
-        "🗑️ **Delete Dump Files**\n\n"
-        "This will permanently delete all dump files and clear dump data.\n"
-        "Are you sure you want to proceed?",
-        reply_markup=get_delete_dump_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
-    )
+    await _reply_static(update, "deldump")
 
 # Social and Premium Handlers
 
 async def leaderboard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /leaderboard command"""
-    storage = get_user_storage(0)  # Global storage
-    leaderboard = storage.get_leaderboard()
+    leaderboard_text = _get_list_text("leaderboard")
     
-    if not leaderboard:
-        await update.message.reply_text(
-            "📊 **Leaderboard**\n\n"
-            "No data available yet. Start renaming files to appear on the leaderboard!",
-            reply_markup=get_back_keyboard()
+    if leaderboard_text is None:
+        leaderboard = GLOBAL_STORAGE.get_leaderboard()
+        
+        if not leaderboard:
+            await _reply_static(update, "leaderboard_empty")
+            return
+        
+        leaderboard_text = _set_list_text(
+            "leaderboard",
+            _ranked_lines("🏆 <b>Top Rename Contributors</b>\n\n", leaderboard, "files")
         )
-        return
-    
-    leaderboard_text = "🏆 **Top Rename Contributors**\n\n"
-    for i, (user_id, username, count) in enumerate(leaderboard[:10], 1):
-        medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
-        leaderboard_text += f"{medal} {username}: {count} files\n"
     
     await update.message.reply_text(
         leaderboard_text,
-        reply_markup=get_leaderboard_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
+        reply_markup=LEADERBOARD_KB
     )
 
 async def top_referrals_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /top_referrals command"""
-    storage = get_user_storage(0)  # Global storage
-    top_referrals = storage.get_top_referrals()
+    referrals_text = _get_list_text("top_referrals")
     
-    if not top_referrals:
-        await update.message.reply_text(
-            "🎯 **Top Referrals**\n\n"
-            "No referral data available yet. Use /refer to start earning referral rewards!",
-            reply_markup=get_back_keyboard()
+    if referrals_text is None:
+        top_referrals = GLOBAL_STORAGE.get_top_referrals()
+        
+        if not top_referrals:
+            await _reply_static(update, "top_referrals_empty")
+            return
+        
+        referrals_text = _set_list_text(
+            "top_referrals",
+            _ranked_lines("🎯 <b>Top Referral Contributors</b>\n\n", top_referrals, "referrals")
         )
-        return
-    
-    referrals_text = "🎯 **Top Referral Contributors**\n\n"
-    for i, (user_id, username, count) in enumerate(top_referrals[:10], 1):
-        medal = "🥇" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else f"{i}."
-        referrals_text += f"{medal} {username}: {count} referrals\n"
     
     await update.message.reply_text(
         referrals_text,
-        reply_markup=get_referrals_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
+        reply_markup=REFERRALS_KB
     )
 
 async def refer_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /refer command"""
-    user = update.effective_user
-    bot_username = context.bot.username
-    
-    referral_link = f"https://t.me/{bot_username}?start=ref_{user.id}"
-    
-    refer_text = f"""
-🎁 **Refer Friends & Earn Premium**
-
-**Your Referral Link:**
-`{referral_link}`
-
-**Rewards:**
-• +{REFERRAL_BONUS_HOURS} hours premium access per referral
-• +{REFERRAL_POINTS_PER_USER} points per new user
-• Exclusive features for top referrers
-
-Share your link with friends to start earning!
-"""
+    # Prefix is built from the bot's username once at startup
+    referral_link = f"{context.bot_data['referral_prefix']}{update.effective_user.id}"
     
     await update.message.reply_text(
-        refer_text,
-        reply_markup=get_refer_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
+        _REFER_FMT(referral_link=referral_link),
+        reply_markup=REFER_KB
     )
 
 async def premium_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /premium command"""
-    user = update.effective_user
-    storage = get_user_storage(user.id)
-    settings = storage.get_user_settings()
+    settings = _user_settings(context)
     
-    is_premium = settings.get('is_premium', False)
-    premium_until = settings.get('premium_until', None)
+    is_premium = bool(settings.get('is_premium'))
+    premium_until = settings.get('premium_until')
     
     if is_premium and premium_until:
-        premium_text = f"""
-💎 **Premium Status: Active**
-
-**Valid Until:** {premium_until}
-
-**Your Premium Features:**
-✅ Unlimited file renames
-✅ Priority processing queue
-✅ Custom thumbnail uploads
-✅ Advanced analytics
-✅ API access
-✅ No watermarks
-✅ Premium support
-
-Thank you for being a premium member!
-"""
+        premium_text = _PREMIUM_ACTIVE_FMT(premium_until=escape(str(premium_until)))
     else:
-        premium_text = """
-💎 **Premium Membership**
-
-**Premium Features:**
-• Unlimited file renames
-• Priority processing queue
-• Custom thumbnail uploads
-• Advanced analytics
-• API access
-• No watermarks
-• Premium support
-
-**Get Premium:**
-• Monthly: $4.99
-• Yearly: $49.99 (Save 17%)
-• Lifetime: $99.99
-
-**Free Ways to Get Premium:**
-• Refer friends (+3 hours each)
-• Top leaderboard positions
-• Community contributions
-"""
+        premium_text = PREMIUM_INACTIVE_TEXT
     
     await update.message.reply_text(
         premium_text,
-        reply_markup=get_premium_keyboard(is_premium),
-        parse_mode=ParseMode.MARKDOWN
+        reply_markup=get_premium_keyboard(is_premium)
     )
 
 async def elites_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /elites command"""
-    storage = get_user_storage(0)  # Global storage
-    elites = storage.get_premium_users()
+    elites_text = _get_list_text("elites")
     
-    if not elites:
-        await update.message.reply_text(
-            "👑 **Elite Premium Users**\n\n"
-            "No premium users yet. Be the first to join the elite club!",
-            reply_markup=get_back_keyboard()
+    if elites_text is None:
+        elites = GLOBAL_STORAGE.get_premium_users()
+        
+        if not elites:
+            await _reply_static(update, "elites_empty")
+            return
+        
+        elites_text = _set_list_text(
+            "elites",
+            "👑 <b>Elite Premium Members</b>\n\n" + "\n".join(
+                f"{_TIER_ICONS.get(tier, '⭐')} {escape(username)} ({tier.title()})"
+                for _, username, tier in elites[:20]
+            )
         )
-        return
-    
-    elites_text = "👑 **Elite Premium Members**\n\n"
-    for i, (user_id, username, tier) in enumerate(elites[:20], 1):
-        crown = "👑" if tier == "lifetime" else "💎" if tier == "yearly" else "⭐"
-        elites_text += f"{crown} {username} ({tier.title()})\n"
     
     await update.message.reply_text(
         elites_text,
-        reply_markup=get_elites_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
+        reply_markup=ELITES_KB
     )
 
 async def features_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /features command"""
-    features_text = """
-🚀 **Bot Features Overview**
-
-**🔧 Rename System:**
-• Auto-rename with custom templates
-• Manual rename mode
-• Text replacement rules
-• Variable support
-
-**🎨 Customization:**
-• Banner control panel
-• Thumbnail management (Normal/Season/Quality)
-• Caption formatting (11 styles)
-• Metadata editing
-
-**📁 File Support:**
-• Up to 5GB file size
-• All media formats
-• Document processing
-• Thumbnail extraction
-
-**💎 Premium Features:**
-• Unlimited processing
-• Priority queue
-• Advanced analytics
-• API access
-
-**🎯 Social Features:**
-• Referral system
-• Leaderboards
-• Premium community
-• Elite status
-
-**🛠️ Advanced:**
-• Dump management
-• Batch processing
-• Progress tracking
-• Admin controls
-"""
-    
-    await update.message.reply_text(
-        features_text,
-        reply_markup=get_features_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
-    )
+    await _reply_static(update, "features")
 
 async def about_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /about command"""
-    about_text = """
-🤖 **About Auto Renamer Bot**
-
-**Version:** 2.0.0
-**Developer:** @AutoRenamerBot
-**Support:** @AutoRenamerSupport
-
-**Statistics:**
-• Files processed: 1M+
-• Active users: 50K+
-• Premium members: 5K+
-• Uptime: 99.9%
-
-**Features:**
-• 26+ Commands
-• Inline keyboard interface
-• 5GB file support
-• Advanced templates
-• Premium system
-
-**Links:**
-• Channel: @AutoRenamerChannel
-• Support: @AutoRenamerSupport
-• Updates: @AutoRenamerNews
-
-Thank you for using our bot! ❤️
-"""
-    
-    await update.message.reply_text(
-        about_text,
-        reply_markup=get_about_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
-    )
+    await _reply_static(update, "about")
 
 async def admin_cmd_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /admin_cmd command - Admin only"""
-    user = update.effective_user
-    
-    if user.id not in ADMIN_IDS:
-        await update.message.reply_text("❌ Access denied. Admin only command.")
+    if update.effective_user.id not in ADMIN_IDS:
+        await _reply_static(update, "admin_denied")
         return
     
-    await update.message.reply_text(
-        "🔐 **Admin Control Panel**\n\n"
-        "Welcome to the admin interface.",
-        reply_markup=get_admin_keyboard(),
-        parse_mode=ParseMode.MARKDOWN
-    )
+    await _reply_static(update, "admin")
 
 # File Handler
 
@@ -576,138 +747,173 @@ async def file_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     message = update.message
     
-    # Check file size
-    file_size = 0
-    file_obj = None
-    
-    if message.document:
-        file_obj = message.document
-        file_size = file_obj.file_size
-    elif message.photo:
-        file_obj = message.photo[-1]  # Largest photo
-        file_size = file_obj.file_size or 0
-    elif message.video:
-        file_obj = message.video
-        file_size = file_obj.file_size
-    elif message.audio:
-        file_obj = message.audio
-        file_size = file_obj.file_size
+    # Photos come as a tuple of sizes, the last is the largest
+    file_obj = message.effective_attachment
+    if isinstance(file_obj, tuple):
+        file_obj = file_obj[-1] if file_obj else None
     
+    # These checks are local, so rejected files get a single reply and no placeholder
     if not file_obj:
         await message.reply_text(MESSAGES["no_file"])
         return
     
+    # Check file size
+    file_size = file_obj.file_size or 0
     if file_size > MAX_FILE_SIZE:
         await message.reply_text(MESSAGES["file_too_large"])
         return
     
-    # Send processing message
+    # Acknowledge before any slow work; every outcome below edits this placeholder
     processing_msg = await message.reply_text(
         MESSAGES["processing"],
-        reply_markup=get_processing_keyboard()
+        reply_markup=PROCESSING_KB
     )
+    sent_at = time.monotonic()
     
     try:
         # Initialize file processor
         processor = FileProcessor(user.id)
         
-        # Process the file
-        result = await processor.process_file(file_obj, message.caption or "")
+        # Process the file; time spent waiting for a slot does not count against the timeout
+        async with _FILE_SEMAPHORE:
+            result = await asyncio.wait_for(
+                processor.process_file(file_obj, message.caption or ""),
+                timeout=FILE_PROCESS_TIMEOUT
+            )
         
         if result["success"]:
-            # Update processing message
-            await processing_msg.edit_text(
-                MESSAGES["rename_success"],
-                reply_markup=get_success_keyboard()
-            )
-            
-            # Send renamed file
-            with open(result["output_path"], 'rb') as f:
-                await message.reply_document(
-                    document=InputFile(f),
-                    filename=result["new_name"],
-                    caption=f"✅ Renamed: `{result['new_name']}`",
-                    parse_mode=ParseMode.MARKDOWN
-                )
+            try:
+                # The status edit and the upload are independent requests, so run them together
+                async with asyncio.TaskGroup() as tg:
+                    tg.create_task(_throttled_edit(
+                        processing_msg, sent_at,
+                        MESSAGES["rename_success"],
+                        reply_markup=SUCCESS_KB
+                    ))
+                    
+                    # The open file is streamed to Telegram rather than read into memory first
+                    async with _UPLOAD_SEMAPHORE:
+                        with open(result["output_path"], 'rb') as f:
+                            await message.reply_document(
+                                document=InputFile(f, filename=result["new_name"], read_file_handle=False),
+                                caption=_RENAMED_CAPTION_FMT(new_name=escape(result["new_name"])),
+                                # Give large uploads time to finish instead of failing on the default timeout
+                                write_timeout=max(UPLOAD_MIN_WRITE_TIMEOUT, file_size // UPLOAD_BYTES_PER_SECOND)
+                            )
+            finally:
+                # The renamed file is only kept for the upload
+                try:
+                    await aiofiles.os.remove(result["output_path"])
+                except OSError:
+                    pass
         else:
-            await processing_msg.edit_text(
-                MESSAGES["error"].format(error=result["error"]),
-                reply_markup=get_error_keyboard()
+            await _throttled_edit(
+                processing_msg, sent_at,
+                _ERROR_FMT(error=escape(str(result["error"]))),
+                reply_markup=ERROR_KB
             )
     
+    except asyncio.TimeoutError:
+        await _throttled_edit(
+            processing_msg, sent_at,
+            _ERROR_FMT(error="processing timed out"),
+            reply_markup=ERROR_KB
+        )
+    
     except Exception as e:
-        await processing_msg.edit_text(
-            MESSAGES["error"].format(error=str(e)),
-            reply_markup=get_error_keyboard()
+        # Failures inside the upload TaskGroup arrive wrapped in an ExceptionGroup
+        if isinstance(e, ExceptionGroup):
+            e = e.exceptions[0]
+        
+        await _throttled_edit(
+            processing_msg, sent_at,
+            _ERROR_FMT(error=escape(str(e))),
+            reply_markup=ERROR_KB
         )
 
 # Callback Query Handler
 
+# Setting callbacks carry their value after a ":" separator,
+# e.g. "rename_mode:manual" or "banner_position:END"
+
+# Mode settings: display label and whether the chosen value is title-cased
+_MODE_SETTERS = {
+    "rename_mode": ("Rename", True),
+    "caption_mode": ("Caption", False),
+    "thumbnail_mode": ("Thumbnail", True),
+}
+
+async def _set_mode(key: str, query, storage, mode: str):
+    storage.set_setting(key, mode)
+    label, titlecase = _MODE_SETTERS[key]
+    await query.edit_message_text(
+        f"✅ {label} mode set to: <b>{mode.title() if titlecase else mode}</b>",
+        reply_markup=BACK_KB
+    )
+
+async def _set_banner_position(query, storage, position: str):
+    storage.set_setting('banner_position', position)
+    storage.set_setting('banner_enabled', position != "DISABLED")
+    
+    await query.edit_message_text(
+        f"✅ Banner position set to: <b>{position}</b>",
+        reply_markup=BANNER_KB
+    )
+
+_CALLBACK_PREFIXES = {
+    **{key: partial(_set_mode, key) for key in _MODE_SETTERS},
+    "banner_position": _set_banner_position,
+}
+
+# Underscore-style data of keyboards sent before the ":" format, e.g. "rename_mode_manual";
+# kept so those messages still work, and can go once they are no longer in use
+_LEGACY_CALLBACKS = {
+    f"{key}_{value}": f"{key}:{value}"
+    for key, values in (
+        ("rename_mode", ("autorename", "manual", "replace")),
+        ("caption_mode", [mode.lower().replace(' ', '_') for mode in CAPTION_MODES]),
+        ("thumbnail_mode", ("normal", "season", "quality")),
+        ("banner_position", BANNER_POSITIONS),
+    )
+    for value in values
+}
+
+async def _show_main_menu(query):
+    await query.edit_message_text(
+        _START_MSG,
+        reply_markup=MAIN_MENU_KB
+    )
+
+async def _show_back(query):
+    await query.edit_message_text(
+        BACK_TEXT,
+        reply_markup=MAIN_MENU_KB
+    )
+
+# Callbacks matched on their whole data string
+_CALLBACK_ROUTES = {
+    "main_menu": _show_main_menu,
+    "back": _show_back,
+}
+
 async def callback_query_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle inline keyboard button callbacks"""
     query = update.callback_query
     await query.answer()
     
-    data = query.data
-    user = update.effective_user
-    storage = get_user_storage(user.id)
-    
-    if data.startswith("rename_mode_"):
-        mode = data.replace("rename_mode_", "")
-        storage.set_setting('rename_mode', mode)
-        await query.edit_message_text(
-            f"✅ Rename mode set to: **{mode.title()}**",
-            parse_mode=ParseMode.MARKDOWN,
-            reply_markup=get_back_keyboard()
-        )
-    
-    elif data.startswith("caption_mode_"):
-        mode = data.replace("caption_mode_", "")
-        storage.set_setting('caption_mode', mode)
-        await query.edit_message_text(
-            f"✅ Caption mode set to: **{mode}**",
-            parse_mode=ParseMode.MARKDOWN,
-            reply_markup=get_back_keyboard()
-        )
-    
-    elif data.startswith("thumbnail_mode_"):
-        mode = data.replace("thumbnail_mode_", "")
-        storage.set_setting('thumbnail_mode', mode)
-        await query.edit_message_text(
-            f"✅ Thumbnail mode set to: **{mode.title()}**",
-            parse_mode=ParseMode.MARKDOWN,
-            reply_markup=get_back_keyboard()
-        )
-    
-    elif data.startswith("banner_position_"):
-        position = data.replace("banner_position_", "")
-        storage.set_setting('banner_position', position)
-        if position == "DISABLED":
-            storage.set_setting('banner_enabled', False)
-        else:
-            storage.set_setting('banner_enabled', True)
-        
-        await query.edit_message_text(
-            f"✅ Banner position set to: **{position}**",
-            parse_mode=ParseMode.MARKDOWN,
-            reply_markup=get_banner_keyboard()
-        )
-    
-    elif data == "main_menu":
-        await query.edit_message_text(
-            MESSAGES["start"],
-            reply_markup=get_main_menu_keyboard(),
-            parse_mode=ParseMode.MARKDOWN
-        )
+    data = _LEGACY_CALLBACKS.get(query.data, query.data)
+    route = _CALLBACK_ROUTES.get(data)
+    if route:
+        await route(query)
+        return
     
-    elif data == "back":
-        await query.edit_message_text(
-            "🔙 Returned to main menu",
-            reply_markup=get_main_menu_keyboard()
-        )
+    prefix, sep, value = data.partition(":")
+    setter = _CALLBACK_PREFIXES.get(prefix) if sep else None
     
+    if setter:
+        await setter(query, _user_storage(context), value)
     else:
         await query.edit_message_text(
-            "⚠️ Feature coming soon!",
-            reply_markup=get_back_keyboard()
+            COMING_SOON_TEXT,
+            reply_markup=BACK_KB
         )
\ No newline at end of file
@@ -3,487 +3,306 @@ Inline keyboard layouts for the Telegram Auto Renamer Bot
 All interactive button menus and shortcuts
 """
 
-from telegram import InlineKeyboardButton, InlineKeyboardMarkup
-from config import CAPTION_MODES, BANNER_POSITIONS
-
-def get_main_menu_keyboard():
-    """Main menu with primary bot functions"""
-    keyboard = [
-        [
-            InlineKeyboardButton("✏️ Rename Settings", callback_data="rename_settings"),
-            InlineKeyboardButton("🎨 Customization", callback_data="customization")
-        ],
-        [
-            InlineKeyboardButton("📁 File Management", callback_data="file_management"),
-            InlineKeyboardButton("📊 Analytics", callback_data="analytics")
-        ],
-        [
-            InlineKeyboardButton("💎 Premium", callback_data="premium_menu"),
-            InlineKeyboardButton("🎯 Social", callback_data="social_menu")
-        ],
-        [
-            InlineKeyboardButton("⚙️ Settings", callback_data="settings"),
-            InlineKeyboardButton("❓ Help", callback_data="help")
-        ]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+from functools import partial
 
-def get_rename_settings_keyboard():
-    """Rename system controls"""
-    keyboard = [
-        [
-            InlineKeyboardButton("🔧 Auto-Rename", callback_data="autorename"),
-            InlineKeyboardButton("🔍 Preview", callback_data="preview")
-        ],
-        [
-            InlineKeyboardButton("📝 Mode", callback_data="mode"),
-            InlineKeyboardButton("🔄 Replace", callback_data="replace")
-        ],
-        [
-            InlineKeyboardButton("📂 Source", callback_data="renamesource"),
-            InlineKeyboardButton("📋 Metadata", callback_data="metadata")
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="main_menu")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_customization_keyboard():
-    """Customization options"""
-    keyboard = [
-        [
-            InlineKeyboardButton("🎨 Banner Control", callback_data="banner"),
-            InlineKeyboardButton("📷 Thumbnails", callback_data="thumbnails")
-        ],
-        [
-            InlineKeyboardButton("💬 Caption Mode", callback_data="caption_mode"),
-            InlineKeyboardButton("📱 Media Type", callback_data="setmediatype")
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="main_menu")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+import orjson
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from config import CAPTION_MODES, QUALITY_OPTIONS, SEASON_OPTIONS
 
-def get_mode_keyboard():
-    """Rename mode selection"""
-    keyboard = [
-        [InlineKeyboardButton("🤖 Autorename", callback_data="rename_mode_autorename")],
-        [InlineKeyboardButton("✏️ Manual", callback_data="rename_mode_manual")],
-        [InlineKeyboardButton("🔄 Replace", callback_data="rename_mode_replace")],
-        [InlineKeyboardButton("🔙 Back", callback_data="main_menu")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+# Every layout is static, so each one is declared below as rows of
+# (label, callback_data) pairs and compiled into a markup once at import
 
-def get_caption_mode_keyboard():
-    """Caption formatting options - 11 styles"""
-    keyboard = []
+class _PrebuiltMarkup(InlineKeyboardMarkup):
+    """InlineKeyboardMarkup whose request payload is built once instead of on every send"""
     
-    # Create rows of 2 buttons each
-    for i in range(0, len(CAPTION_MODES), 2):
-        row = []
-        for j in range(i, min(i + 2, len(CAPTION_MODES))):
-            mode = CAPTION_MODES[j]
-            row.append(InlineKeyboardButton(mode, callback_data=f"caption_mode_{mode.lower().replace(' ', '_')}"))
-        keyboard.append(row)
-    
-    keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="main_menu")])
-    return InlineKeyboardMarkup(keyboard)
-
-def get_banner_keyboard():
-    """Banner control panel with position options"""
-    keyboard = [
-        [InlineKeyboardButton("📊 STATUS", callback_data="banner_status")],
-        [InlineKeyboardButton("🖼️ IMAGE", callback_data="banner_image")],
-        [InlineKeyboardButton("📍 POSITION", callback_data="banner_position_menu")],
-        [InlineKeyboardButton("🔗 LINK", callback_data="banner_link")],
-        [
-            InlineKeyboardButton("▶️ START", callback_data="banner_position_START"),
-            InlineKeyboardButton("⏹️ END", callback_data="banner_position_END")
-        ],
-        [
-            InlineKeyboardButton("🔄 BOTH", callback_data="banner_position_BOTH"),
-            InlineKeyboardButton("❌ DISABLED", callback_data="banner_position_DISABLED")
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="main_menu")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_thumbnail_mode_keyboard():
-    """Thumbnail management options"""
-    keyboard = [
-        [InlineKeyboardButton("📷 Normal", callback_data="thumbnail_mode_normal")],
-        [InlineKeyboardButton("📺 Season (s01-s10)", callback_data="thumbnail_mode_season")],
-        [InlineKeyboardButton("🎬 Quality (144p-8000p)", callback_data="thumbnail_mode_quality")],
-        [InlineKeyboardButton("📋 View All", callback_data="allthumb")],
-        [InlineKeyboardButton("🗑️ Delete Default", callback_data="del_thumb")],
-        [InlineKeyboardButton("🔙 Back", callback_data="main_menu")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_thumbnail_season_keyboard():
-    """Season-specific thumbnail management (s01-s10)"""
-    keyboard = []
+    __slots__ = ("_payload",)
     
-    # Create season buttons in rows of 5
-    for i in range(0, 10, 5):
-        row = []
-        for j in range(i, min(i + 5, 10)):
-            season_num = f"{j+1:02d}"
-            row.append(InlineKeyboardButton(f"S{season_num}", callback_data=f"thums{season_num}"))
-        keyboard.append(row)
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Markups are frozen after __init__, so the serialized form never goes stale.
+        # It is kept as JSON bytes, and every caller gets its own dict to modify.
+        self._payload = orjson.dumps(super().to_dict())
     
-    # Delete season buttons
-    keyboard.append([InlineKeyboardButton("🗑️ Delete Season", callback_data="delete_season_menu")])
-    keyboard.append([InlineKeyboardButton("🔙 Back", callback_data="thumbnails")])
-    return InlineKeyboardMarkup(keyboard)
-
-def get_thumbnail_quality_keyboard():
-    """Quality-specific thumbnail management"""
-    keyboard = [
-        [
-            InlineKeyboardButton("144p", callback_data="thum144"),
-            InlineKeyboardButton("240p", callback_data="thum240"),
-            InlineKeyboardButton("360p", callback_data="thum360")
-        ],
-        [
-            InlineKeyboardButton("480p", callback_data="thum480"),
-            InlineKeyboardButton("720p", callback_data="thum720"),
-            InlineKeyboardButton("1080p", callback_data="thum1080")
-        ],
-        [
-            InlineKeyboardButton("1440p", callback_data="thum1440"),
-            InlineKeyboardButton("2160p", callback_data="thum2160"),
-            InlineKeyboardButton("4000p", callback_data="thum4000")
-        ],
-        [InlineKeyboardButton("8000p", callback_data="thum8000")],
-        [InlineKeyboardButton("🗑️ Delete Quality", callback_data="delete_quality_menu")],
-        [InlineKeyboardButton("🔙 Back", callback_data="thumbnails")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
+    def to_dict(self, recursive=True):
+        return orjson.loads(self._payload) if recursive else super().to_dict(recursive=False)
+
+def _build(rows):
+    """Compile rows of (label, callback_data) pairs into a markup"""
+    return _PrebuiltMarkup(
+        [[InlineKeyboardButton(label, callback_data=data) for label, data in row] for row in rows]
+    )
+
+def _in_rows(buttons, size):
+    """Split (label, callback_data) pairs into rows of `size` buttons"""
+    return [buttons[i:i + size] for i in range(0, len(buttons), size)]
+
+# Back rows shared by every keyboard that returns to the same menu
+_BACK_MAIN = [("🔙 Back", "main_menu")]
+_BACK_FILE = [("🔙 Back", "file_management")]
+_BACK_SOCIAL = [("🔙 Back", "social_menu")]
+_BACK_HELP = [("🔙 Back", "help")]
+_BACK_RENAME = [("🔙 Back", "rename_settings")]
+_BACK_THUMBS = [("🔙 Back", "thumbnails")]
+
+# Thumbnail upload buttons per season (S01-S10) and per quality
+_SEASON_BUTTONS = tuple((season.upper(), f"thums{season[1:]}") for season in SEASON_OPTIONS)
+_QUALITY_BUTTONS = tuple((quality, f"thum{quality[:-1]}") for quality in QUALITY_OPTIONS)
+
+# (label, callback_data) for each caption mode
+_CAPTION_MODE_BUTTONS = tuple(
+    (mode, f"caption_mode:{mode.lower().replace(' ', '_')}") for mode in CAPTION_MODES
+)
+
+_SPECS = {
+    # Main menu with primary bot functions
+    "main_menu": [
+        [("✏️ Rename Settings", "rename_settings"), ("🎨 Customization", "customization")],
+        [("📁 File Management", "file_management"), ("📊 Analytics", "analytics")],
+        [("💎 Premium", "premium_menu"), ("🎯 Social", "social_menu")],
+        [("⚙️ Settings", "settings"), ("❓ Help", "help")],
+    ],
+    # Rename system controls
+    "rename_settings": [
+        [("🔧 Auto-Rename", "autorename"), ("🔍 Preview", "preview")],
+        [("📝 Mode", "mode"), ("🔄 Replace", "replace")],
+        [("📂 Source", "renamesource"), ("📋 Metadata", "metadata")],
+        _BACK_MAIN,
+    ],
+    # Customization options
+    "customization": [
+        [("🎨 Banner Control", "banner"), ("📷 Thumbnails", "thumbnails")],
+        [("💬 Caption Mode", "caption_mode"), ("📱 Media Type", "setmediatype")],
+        _BACK_MAIN,
+    ],
+    # Rename mode selection
+    "mode": [
+        [("🤖 Autorename", "rename_mode:autorename")],
+        [("✏️ Manual", "rename_mode:manual")],
+        [("🔄 Replace", "rename_mode:replace")],
+        _BACK_MAIN,
+    ],
+    # Caption formatting options - 11 styles, 2 per row
+    "caption_mode": _in_rows(_CAPTION_MODE_BUTTONS, 2) + [_BACK_MAIN],
+    # Banner control panel with position options
+    "banner": [
+        [("📊 STATUS", "banner_status")],
+        [("🖼️ IMAGE", "banner_image")],
+        [("📍 POSITION", "banner_position_menu")],
+        [("🔗 LINK", "banner_link")],
+        [("▶️ START", "banner_position:START"), ("⏹️ END", "banner_position:END")],
+        [("🔄 BOTH", "banner_position:BOTH"), ("❌ DISABLED", "banner_position:DISABLED")],
+        _BACK_MAIN,
+    ],
+    # Thumbnail management options
+    "thumbnail_mode": [
+        [("📷 Normal", "thumbnail_mode:normal")],
+        [("📺 Season (s01-s10)", "thumbnail_mode:season")],
+        [("🎬 Quality (144p-8000p)", "thumbnail_mode:quality")],
+        [("📋 View All", "allthumb")],
+        [("🗑️ Delete Default", "del_thumb")],
+        _BACK_MAIN,
+    ],
+    # Season-specific thumbnail management (s01-s10), 5 per row
+    "thumbnail_season": _in_rows(_SEASON_BUTTONS, 5) + [
+        [("🗑️ Delete Season", "delete_season_menu")],
+        _BACK_THUMBS,
+    ],
+    # Quality-specific thumbnail management, 3 per row
+    "thumbnail_quality": _in_rows(_QUALITY_BUTTONS, 3) + [
+        [("🗑️ Delete Quality", "delete_quality_menu")],
+        _BACK_THUMBS,
+    ],
+    # Premium features and subscription, for free users
+    "premium": [
+        [("💎 Get Premium", "get_premium")],
+        [("🎁 Free Premium", "free_premium")],
+        [("👑 Elite Users", "elites")],
+        [("💰 Pricing", "premium_pricing")],
+        _BACK_MAIN,
+    ],
+    # Premium features, for premium users
+    "premium_active": [
+        [("👑 Premium Status", "premium_status")],
+        [("📊 Analytics", "premium_analytics")],
+        [("🔧 API Access", "premium_api")],
+        [("🎯 Elite Features", "premium_elite")],
+        _BACK_MAIN,
+    ],
+    # Social features menu
+    "social": [
+        [("🎯 Refer Friends", "refer"), ("🏆 Leaderboard", "leaderboard")],
+        [("🔝 Top Referrals", "top_referrals"), ("👑 Elite Users", "elites")],
+        _BACK_MAIN,
+    ],
+    # File processing and dump management
+    "file_management": [
+        [("📋 Metadata", "metadata"), ("🖼️ Get Thumbnail", "getthumb")],
+        [("📤 Dump Settings", "dumpsettings"), ("🗑️ Delete Dump", "deldump")],
+        [("📱 Media Type", "setmediatype"), ("🔄 Batch Process", "batch_process")],
+        _BACK_MAIN,
+    ],
+    # Metadata editing options
+    "metadata": [
+        [("📝 Title", "meta_title"), ("👤 Author", "meta_author")],
+        [("🎵 Artist", "meta_artist"), ("💬 Subtitle", "meta_subtitle")],
+        [("🔊 Audio", "meta_audio"), ("🎬 Video", "meta_video")],
+        _BACK_FILE,
+    ],
+    # Dump configuration options
+    "dump_settings": [
+        [("✅ Enable Dump", "dump_enable"), ("❌ Disable Dump", "dump_disable")],
+        [("📢 Set Channel", "dump_channel"), ("🔄 Forwarding", "dump_forwarding")],
+        _BACK_FILE,
+    ],
+    # Confirm dump deletion
+    "delete_dump": [
+        [("✅ Yes, Delete", "confirm_delete_dump"), ("❌ Cancel", "file_management")],
+    ],
+    # Media type selection
+    "mediatype": [
+        [("📄 Document", "mediatype_document"), ("🎬 Video", "mediatype_video")],
+        [("🎵 Audio", "mediatype_audio"), ("🖼️ Photo", "mediatype_photo")],
+        _BACK_FILE,
+    ],
+    # Auto-rename template setup
+    "autorename": [
+        [("📝 Set Template", "set_template"), ("🔍 Preview", "preview_template")],
+        [("📋 Variables", "template_variables"), ("💡 Examples", "template_examples")],
+        _BACK_RENAME,
+    ],
+    # Admin control panel
+    "admin": [
+        [("👥 Users", "admin_users"), ("📊 Stats", "admin_stats")],
+        [("💎 Premium", "admin_premium"), ("📢 Broadcast", "admin_broadcast")],
+        [("🔧 Settings", "admin_settings"), ("📝 Logs", "admin_logs")],
+        _BACK_MAIN,
+    ],
+    # Processing file progress
+    "processing": [
+        [("⏹️ Cancel", "cancel_processing")],
+    ],
+    # File processing success
+    "success": [
+        [("🔄 Process Another", "main_menu"), ("⚙️ Settings", "settings")],
+    ],
+    # Error handling options
+    "error": [
+        [("🔄 Try Again", "main_menu"), ("💬 Support", "support")],
+    ],
+    # User settings panel
+    "settings": [
+        [("✏️ Rename", "rename_settings"), ("🎨 Style", "customization")],
+        [("📷 Thumbnails", "thumbnails"), ("🎨 Banner", "banner")],
+        [("💎 Premium", "premium_menu"), ("📊 Analytics", "user_analytics")],
+        _BACK_MAIN,
+    ],
+    # Help and support options
+    "help": [
+        [("📚 Commands", "help_commands"), ("🚀 Features", "features")],
+        [("💡 Examples", "help_examples"), ("❓ FAQ", "help_faq")],
+        [("💬 Support", "support"), ("ℹ️ About", "about")],
+        _BACK_MAIN,
+    ],
+    # Leaderboard display options
+    "leaderboard": [
+        [("🔄 Refresh", "leaderboard"), ("🎯 Referrals", "top_referrals")],
+        [("👑 Elite", "elites"), ("📊 My Stats", "my_stats")],
+        _BACK_SOCIAL,
+    ],
+    # Referral system options
+    "refer": [
+        [("📋 Copy Link", "copy_referral"), ("📤 Share", "share_referral")],
+        [("📊 My Referrals", "my_referrals"), ("🎁 Rewards", "referral_rewards")],
+        _BACK_SOCIAL,
+    ],
+    # Elite users display
+    "elites": [
+        [("🔄 Refresh", "elites"), ("💎 Get Premium", "get_premium")],
+        _BACK_SOCIAL,
+    ],
+    # Features overview
+    "features": [
+        [("📝 Rename", "feature_rename"), ("🎨 Custom", "feature_custom")],
+        [("💎 Premium", "feature_premium"), ("🎯 Social", "feature_social")],
+        _BACK_HELP,
+    ],
+    # About bot information
+    "about": [
+        [("📢 Channel", "bot_channel"), ("💬 Support", "bot_support")],
+        [("📰 Updates", "bot_updates"), ("⭐ Rate Bot", "rate_bot")],
+        _BACK_HELP,
+    ],
+    # Top referrals display
+    "referrals": [
+        [("🔄 Refresh", "top_referrals"), ("🎯 My Referrals", "my_referrals")],
+        [("🎁 Refer Now", "refer"), ("🏆 Leaderboard", "leaderboard")],
+        _BACK_SOCIAL,
+    ],
+    # Text replacement setup
+    "replace": [
+        [("📝 Set Rule", "set_replace_rule"), ("👁️ View Rules", "view_replace_rules")],
+        [("🗑️ Clear Rules", "clear_replace_rules"), ("💡 Examples", "replace_examples")],
+        _BACK_RENAME,
+    ],
+    # Template preview options
+    "preview": [
+        [("✏️ Edit Template", "edit_template"), ("🔄 Generate New", "generate_preview")],
+        _BACK_RENAME,
+    ],
+    # Simple back button
+    "back": [_BACK_MAIN],
+}
+
+KEYBOARDS = {name: _build(rows) for name, rows in _SPECS.items()}
 
 def get_premium_keyboard(is_premium=False):
     """Premium features and subscription"""
-    if is_premium:
-        keyboard = [
-            [InlineKeyboardButton("👑 Premium Status", callback_data="premium_status")],
-            [InlineKeyboardButton("📊 Analytics", callback_data="premium_analytics")],
-            [InlineKeyboardButton("🔧 API Access", callback_data="premium_api")],
-            [InlineKeyboardButton("🎯 Elite Features", callback_data="premium_elite")],
-            [InlineKeyboardButton("🔙 Back", callback_data="main_menu")]
-        ]
-    else:
-        keyboard = [
-            [InlineKeyboardButton("💎 Get Premium", callback_data="get_premium")],
-            [InlineKeyboardButton("🎁 Free Premium", callback_data="free_premium")],
-            [InlineKeyboardButton("👑 Elite Users", callback_data="elites")],
-            [InlineKeyboardButton("💰 Pricing", callback_data="premium_pricing")],
-            [InlineKeyboardButton("🔙 Back", callback_data="main_menu")]
-        ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_social_keyboard():
-    """Social features menu"""
-    keyboard = [
-        [
-            InlineKeyboardButton("🎯 Refer Friends", callback_data="refer"),
-            InlineKeyboardButton("🏆 Leaderboard", callback_data="leaderboard")
-        ],
-        [
-            InlineKeyboardButton("🔝 Top Referrals", callback_data="top_referrals"),
-            InlineKeyboardButton("👑 Elite Users", callback_data="elites")
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="main_menu")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_file_management_keyboard():
-    """File processing and dump management"""
-    keyboard = [
-        [
-            InlineKeyboardButton("📋 Metadata", callback_data="metadata"),
-            InlineKeyboardButton("🖼️ Get Thumbnail", callback_data="getthumb")
-        ],
-        [
-            InlineKeyboardButton("📤 Dump Settings", callback_data="dumpsettings"),
-            InlineKeyboardButton("🗑️ Delete Dump", callback_data="deldump")
-        ],
-        [
-            InlineKeyboardButton("📱 Media Type", callback_data="setmediatype"),
-            InlineKeyboardButton("🔄 Batch Process", callback_data="batch_process")
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="main_menu")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_metadata_keyboard():
-    """Metadata editing options"""
-    keyboard = [
-        [
-            InlineKeyboardButton("📝 Title", callback_data="meta_title"),
-            InlineKeyboardButton("👤 Author", callback_data="meta_author")
-        ],
-        [
-            InlineKeyboardButton("🎵 Artist", callback_data="meta_artist"),
-            InlineKeyboardButton("💬 Subtitle", callback_data="meta_subtitle")
-        ],
-        [
-            InlineKeyboardButton("🔊 Audio", callback_data="meta_audio"),
-            InlineKeyboardButton("🎬 Video", callback_data="meta_video")
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="file_management")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_dump_settings_keyboard():
-    """Dump configuration options"""
-    keyboard = [
-        [
-            InlineKeyboardButton("✅ Enable Dump", callback_data="dump_enable"),
-            InlineKeyboardButton("❌ Disable Dump", callback_data="dump_disable")
-        ],
-        [
-            InlineKeyboardButton("📢 Set Channel", callback_data="dump_channel"),
-            InlineKeyboardButton("🔄 Forwarding", callback_data="dump_forwarding")
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="file_management")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_delete_dump_keyboard():
-    """Confirm dump deletion"""
-    keyboard = [
-        [
-            InlineKeyboardButton("✅ Yes, Delete", callback_data="confirm_delete_dump"),
-            InlineKeyboardButton("❌ Cancel", callback_data="file_management")
-        ]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_mediatype_keyboard():
-    """Media type selection"""
-    keyboard = [
-        [
-            InlineKeyboardButton("📄 Document", callback_data="mediatype_document"),
-            InlineKeyboardButton("🎬 Video", callback_data="mediatype_video")
-        ],
-        [
-            InlineKeyboardButton("🎵 Audio", callback_data="mediatype_audio"),
-            InlineKeyboardButton("🖼️ Photo", callback_data="mediatype_photo")
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="file_management")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_autorename_keyboard():
-    """Auto-rename template setup"""
-    keyboard = [
-        [
-            InlineKeyboardButton("📝 Set Template", callback_data="set_template"),
-            InlineKeyboardButton("🔍 Preview", callback_data="preview_template")
-        ],
-        [
-            InlineKeyboardButton("📋 Variables", callback_data="template_variables"),
-            InlineKeyboardButton("💡 Examples", callback_data="template_examples")
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="rename_settings")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_admin_keyboard():
-    """Admin control panel"""
-    keyboard = [
-        [
-            InlineKeyboardButton("👥 Users", callback_data="admin_users"),
-            InlineKeyboardButton("📊 Stats", callback_data="admin_stats")
-        ],
-        [
-            InlineKeyboardButton("💎 Premium", callback_data="admin_premium"),
-            InlineKeyboardButton("📢 Broadcast", callback_data="admin_broadcast")
-        ],
-        [
-            InlineKeyboardButton("🔧 Settings", callback_data="admin_settings"),
-            InlineKeyboardButton("📝 Logs", callback_data="admin_logs")
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="main_menu")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_processing_keyboard():
-    """Processing file progress"""
-    keyboard = [
-        [InlineKeyboardButton("⏹️ Cancel", callback_data="cancel_processing")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_success_keyboard():
-    """File processing success"""
-    keyboard = [
-        [
-            InlineKeyboardButton("🔄 Process Another", callback_data="main_menu"),
-            InlineKeyboardButton("⚙️ Settings", callback_data="settings")
-        ]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_error_keyboard():
-    """Error handling options"""
-    keyboard = [
-        [
-            InlineKeyboardButton("🔄 Try Again", callback_data="main_menu"),
-            InlineKeyboardButton("💬 Support", callback_data="support")
-        ]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_settings_keyboard():
-    """User settings panel"""
-    keyboard = [
-        [
-            InlineKeyboardButton("✏️ Rename", callback_data="rename_settings"),
-            InlineKeyboardButton("🎨 Style", callback_data="customization")
-        ],
-        [
-            InlineKeyboardButton("📷 Thumbnails", callback_data="thumbnails"),
-            InlineKeyboardButton("🎨 Banner", callback_data="banner")
-        ],
-        [
-            InlineKeyboardButton("💎 Premium", callback_data="premium_menu"),
-            InlineKeyboardButton("📊 Analytics", callback_data="user_analytics")
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="main_menu")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_help_keyboard():
-    """Help and support options"""
-    keyboard = [
-        [
-            InlineKeyboardButton("📚 Commands", callback_data="help_commands"),
-            InlineKeyboardButton("🚀 Features", callback_data="features")
-        ],
-        [
-            InlineKeyboardButton("💡 Examples", callback_data="help_examples"),
-            InlineKeyboardButton("❓ FAQ", callback_data="help_faq")
-        ],
-        [
-            InlineKeyboardButton("💬 Support", callback_data="support"),
-            InlineKeyboardButton("ℹ️ About", callback_data="about")
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="main_menu")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_leaderboard_keyboard():
-    """Leaderboard display options"""
-    keyboard = [
-        [
-            InlineKeyboardButton("🔄 Refresh", callback_data="leaderboard"),
-            InlineKeyboardButton("🎯 Referrals", callback_data="top_referrals")
-        ],
-        [
-            InlineKeyboardButton("👑 Elite", callback_data="elites"),
-            InlineKeyboardButton("📊 My Stats", callback_data="my_stats")
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="social_menu")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_refer_keyboard():
-    """Referral system options"""
-    keyboard = [
-        [
-            InlineKeyboardButton("📋 Copy Link", callback_data="copy_referral"),
-            InlineKeyboardButton("📤 Share", callback_data="share_referral")
-        ],
-        [
-            InlineKeyboardButton("📊 My Referrals", callback_data="my_referrals"),
-            InlineKeyboardButton("🎁 Rewards", callback_data="referral_rewards")
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="social_menu")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_elites_keyboard():
-    """Elite users display"""
-    keyboard = [
-        [
-            InlineKeyboardButton("🔄 Refresh", callback_data="elites"),
-            InlineKeyboardButton("💎 Get Premium", callback_data="get_premium")
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="social_menu")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_features_keyboard():
-    """Features overview"""
-    keyboard = [
-        [
-            InlineKeyboardButton("📝 Rename", callback_data="feature_rename"),
-            InlineKeyboardButton("🎨 Custom", callback_data="feature_custom")
-        ],
-        [
-            InlineKeyboardButton("💎 Premium", callback_data="feature_premium"),
-            InlineKeyboardButton("🎯 Social", callback_data="feature_social")
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="help")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_about_keyboard():
-    """About bot information"""
-    keyboard = [
-        [
-            InlineKeyboardButton("📢 Channel", callback_data="bot_channel"),
-            InlineKeyboardButton("💬 Support", callback_data="bot_support")
-        ],
-        [
-            InlineKeyboardButton("📰 Updates", callback_data="bot_updates"),
-            InlineKeyboardButton("⭐ Rate Bot", callback_data="rate_bot")
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="help")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_referrals_keyboard():
-    """Top referrals display"""
-    keyboard = [
-        [
-            InlineKeyboardButton("🔄 Refresh", callback_data="top_referrals"),
-            InlineKeyboardButton("🎯 My Referrals", callback_data="my_referrals")
-        ],
-        [
-            InlineKeyboardButton("🎁 Refer Now", callback_data="refer"),
-            InlineKeyboardButton("🏆 Leaderboard", callback_data="leaderboard")
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="social_menu")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_replace_keyboard():
-    """Text replacement setup"""
-    keyboard = [
-        [
-            InlineKeyboardButton("📝 Set Rule", callback_data="set_replace_rule"),
-            InlineKeyboardButton("👁️ View Rules", callback_data="view_replace_rules")
-        ],
-        [
-            InlineKeyboardButton("🗑️ Clear Rules", callback_data="clear_replace_rules"),
-            InlineKeyboardButton("💡 Examples", callback_data="replace_examples")
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="rename_settings")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_preview_keyboard():
-    """Template preview options"""
-    keyboard = [
-        [
-            InlineKeyboardButton("✏️ Edit Template", callback_data="edit_template"),
-            InlineKeyboardButton("🔄 Generate New", callback_data="generate_preview")
-        ],
-        [InlineKeyboardButton("🔙 Back", callback_data="rename_settings")]
-    ]
-    return InlineKeyboardMarkup(keyboard)
-
-def get_back_keyboard():
-    """Simple back button"""
-    keyboard = [[InlineKeyboardButton("🔙 Back", callback_data="main_menu")]]
-    return InlineKeyboardMarkup(keyboard)
\ No newline at end of file
+    return KEYBOARDS["premium_active" if is_premium else "premium"]
+
+# Factory names kept for existing callers; each just returns the prebuilt markup
+get_main_menu_keyboard = partial(KEYBOARDS.__getitem__, "main_menu")
+get_rename_settings_keyboard = partial(KEYBOARDS.__getitem__, "rename_settings")
+get_customization_keyboard = partial(KEYBOARDS.__getitem__, "customization")
+get_mode_keyboard = partial(KEYBOARDS.__getitem__, "mode")
+get_caption_mode_keyboard = partial(KEYBOARDS.__getitem__, "caption_mode")
+get_banner_keyboard = partial(KEYBOARDS.__getitem__, "banner")
+get_thumbnail_mode_keyboard = partial(KEYBOARDS.__getitem__, "thumbnail_mode")
+get_thumbnail_season_keyboard = partial(KEYBOARDS.__getitem__, "thumbnail_season")
+get_thumbnail_quality_keyboard = partial(KEYBOARDS.__getitem__, "thumbnail_quality")
+get_social_keyboard = partial(KEYBOARDS.__getitem__, "social")
+get_file_management_keyboard = partial(KEYBOARDS.__getitem__, "file_management")
+get_metadata_keyboard = partial(KEYBOARDS.__getitem__, "metadata")
+get_dump_settings_keyboard = partial(KEYBOARDS.__getitem__, "dump_settings")
+get_delete_dump_keyboard = partial(KEYBOARDS.__getitem__, "delete_dump")
+get_mediatype_keyboard = partial(KEYBOARDS.__getitem__, "mediatype")
+get_autorename_keyboard = partial(KEYBOARDS.__getitem__, "autorename")
+get_admin_keyboard = partial(KEYBOARDS.__getitem__, "admin")
+get_processing_keyboard = partial(KEYBOARDS.__getitem__, "processing")
+get_success_keyboard = partial(KEYBOARDS.__getitem__, "success")
+get_error_keyboard = partial(KEYBOARDS.__getitem__, "error")
+get_settings_keyboard = partial(KEYBOARDS.__getitem__, "settings")
+get_help_keyboard = partial(KEYBOARDS.__getitem__, "help")
+get_leaderboard_keyboard = partial(KEYBOARDS.__getitem__, "leaderboard")
+get_refer_keyboard = partial(KEYBOARDS.__getitem__, "refer")
+get_elites_keyboard = partial(KEYBOARDS.__getitem__, "elites")
+get_features_keyboard = partial(KEYBOARDS.__getitem__, "features")
+get_about_keyboard = partial(KEYBOARDS.__getitem__, "about")
+get_referrals_keyboard = partial(KEYBOARDS.__getitem__, "referrals")
+get_replace_keyboard = partial(KEYBOARDS.__getitem__, "replace")
+get_preview_keyboard = partial(KEYBOARDS.__getitem__, "preview")
+get_back_keyboard = partial(KEYBOARDS.__getitem__, "back")
+
+# Shared markups for keyboards sent outside the static responses
+MAIN_MENU_KB = KEYBOARDS["main_menu"]
+BACK_KB = KEYBOARDS["back"]
+BANNER_KB = KEYBOARDS["banner"]
+SETTINGS_KB = KEYBOARDS["settings"]
+PREVIEW_KB = KEYBOARDS["preview"]
+DUMP_SETTINGS_KB = KEYBOARDS["dump_settings"]
+LEADERBOARD_KB = KEYBOARDS["leaderboard"]
+REFERRALS_KB = KEYBOARDS["referrals"]
+REFER_KB = KEYBOARDS["refer"]
+ELITES_KB = KEYBOARDS["elites"]
+PROCESSING_KB = KEYBOARDS["processing"]
+SUCCESS_KB = KEYBOARDS["success"]
+ERROR_KB = KEYBOARDS["error"]
@@ -5,97 +5,159 @@ Handles bot initialization, webhook setup, and command routing
 
 import asyncio
 import logging
-from pathlib import Path
-from aiohttp import web, ClientSession
-from telegram import Update, Bot
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
+import queue
+import signal
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
 
-from config import *
-from bot.handlers import (
-    start_handler, help_handler, settings_handler,
-    autorename_handler, preview_handler, mode_handler, replace_handler,
-    banner_handler, thumbnail_mode_handler, caption_mode_handler,
-    premium_handler, refer_handler, leaderboard_handler,
-    metadata_handler, setmediatype_handler, getthumb_handler,
-    dumpsettings_handler, deldump_handler, top_referrals_handler,
-    elites_handler, features_handler, about_handler, admin_cmd_handler,
-    file_handler, callback_query_handler
+import orjson
+from telegram import Update
+from telegram.constants import ParseMode
+from telegram.ext import AIORateLimiter, Application, CommandHandler, Defaults, MessageHandler, CallbackQueryHandler, TypeHandler, filters
+from telegram.request import HTTPXRequest
+
+from config import (
+    BOT_TOKEN, WEB_SERVER, HOST, PORT,
+    WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_SECRET,
+    CONNECTION_POOL_SIZE, API_READ_TIMEOUT, API_WRITE_TIMEOUT, API_POOL_TIMEOUT, API_HTTP_VERSION,
+    CONCURRENT_UPDATES, UPDATE_QUEUE_SIZE,
+    SETTINGS_FLUSH_INTERVAL, SEASON_CMDS, QUALITY_CMDS, LOG_LEVEL, LOG_FILE
 )
+from bot.storage import flush_pending_increments, flush_pending_settings
 
 logger = logging.getLogger(__name__)
 
+# Updates arrive through our own web server instead of long polling
+USE_WEBHOOK = bool(WEB_SERVER and WEBHOOK_URL)
+
+# Only these update types have handlers; Telegram skips sending the rest
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY]
+
+# Health probes arrive every few seconds; the body never changes
+_HEALTH_BODY = orjson.dumps({"status": "healthy", "bot": "auto_renamer"})
+
+# Files the bot renames; documents are by far the most common, so they are checked first
+FILE_FILTER = filters.Document.ALL | filters.PHOTO | filters.VIDEO | filters.AUDIO
+
+async def _noop(update: Update, context):
+    """Handler for commands that are registered but not implemented yet"""
+
 class AutoRenamerBot:
     def __init__(self):
         self.application = None
         self.web_app = None
+        self._web = None
         
     async def setup_application(self):
         """Initialize the telegram bot application"""
-        self.application = Application.builder().token(BOT_TOKEN).build()
-        
-        # Register command handlers
-        self.application.add_handler(CommandHandler("start", start_handler))
-        self.application.add_handler(CommandHandler("help", help_handler))
-        self.application.add_handler(CommandHandler("settings", settings_handler))
-        
-        # Rename system handlers
-        self.application.add_handler(CommandHandler("autorename", autorename_handler))
-        self.application.add_handler(CommandHandler("preview", preview_handler))
-        self.application.add_handler(CommandHandler("mode", mode_handler))
-        self.application.add_handler(CommandHandler("replace", replace_handler))
-        self.application.add_handler(CommandHandler("renamesource", lambda u, c: None))  # Placeholder
-        
-        # File and metadata handlers
-        self.application.add_handler(CommandHandler("metadata", metadata_handler))
-        self.application.add_handler(CommandHandler("setmediatype", setmediatype_handler))
-        self.application.add_handler(CommandHandler("getthumb", getthumb_handler))
-        
-        # Thumbnail management handlers
-        self.application.add_handler(CommandHandler("thumbnail_mode", thumbnail_mode_handler))
-        self.application.add_handler(CommandHandler("allthumb", lambda u, c: None))  # Placeholder
-        self.application.add_handler(CommandHandler("del_thumb", lambda u, c: None))  # Placeholder
-        
-        # Season thumbnail handlers (s01-s10)
-        for i in range(1, 11):
-            season_num = f"{i:02d}"
-            self.application.add_handler(CommandHandler(f"thums{season_num}", lambda u, c: None))
-            self.application.add_handler(CommandHandler(f"delthumbs{season_num}", lambda u, c: None))
-        
-        # Quality thumbnail handlers
-        for quality in QUALITY_OPTIONS:
-            quality_num = quality.replace("p", "")
-            self.application.add_handler(CommandHandler(f"thum{quality_num}", lambda u, c: None))
-            self.application.add_handler(CommandHandler(f"delthum{quality_num}", lambda u, c: None))
-        
-        # Banner and caption handlers
-        self.application.add_handler(CommandHandler("banner", banner_handler))
-        self.application.add_handler(CommandHandler("caption_mode", caption_mode_handler))
-        
-        # Dump management handlers
-        self.application.add_handler(CommandHandler("dumpsettings", dumpsettings_handler))
-        self.application.add_handler(CommandHandler("deldump", deldump_handler))
-        
-        # Social and premium handlers
-        self.application.add_handler(CommandHandler("leaderboard", leaderboard_handler))
-        self.application.add_handler(CommandHandler("top_referrals", top_referrals_handler))
-        self.application.add_handler(CommandHandler("refer", refer_handler))
-        self.application.add_handler(CommandHandler("premium", premium_handler))
-        self.application.add_handler(CommandHandler("elites", elites_handler))
-        self.application.add_handler(CommandHandler("features", features_handler))
-        self.application.add_handler(CommandHandler("about", about_handler))
-        
-        # Admin handlers
-        self.application.add_handler(CommandHandler("admin_cmd", admin_cmd_handler))
-        
-        # File and callback handlers
-        self.application.add_handler(MessageHandler(filters.Document.ALL | filters.PHOTO | filters.VIDEO | filters.AUDIO, file_handler))
+        # Handlers (and the file processing utilities behind them) are only
+        # imported once the bot actually starts
+        from bot.handlers import (
+            start_handler, help_handler, settings_handler,
+            autorename_handler, preview_handler, mode_handler, replace_handler,
+            banner_handler, thumbnail_mode_handler, caption_mode_handler,
+            premium_handler, refer_handler, leaderboard_handler,
+            metadata_handler, setmediatype_handler, getthumb_handler,
+            dumpsettings_handler, deldump_handler, top_referrals_handler,
+            elites_handler, features_handler, about_handler, admin_cmd_handler,
+            file_handler, callback_query_handler, prime_user_context
+        )
+        
+        # All message texts are HTML, so the parse mode is set once for every call.
+        # AIORateLimiter queues outgoing calls under Telegram's flood limits instead of hitting 429s.
+        # A large connection pool keeps concurrent handlers from waiting on (and re-opening) connections.
+        # HTTP/2 multiplexes those calls, so most of them share a single TLS connection.
+        # The update queue is bounded so a webhook flood is refused instead of buffered without limit.
+        builder = (
+            Application.builder()
+            .token(BOT_TOKEN)
+            .defaults(Defaults(parse_mode=ParseMode.HTML))
+            .request(HTTPXRequest(
+                connection_pool_size=CONNECTION_POOL_SIZE,
+                read_timeout=API_READ_TIMEOUT,
+                write_timeout=API_WRITE_TIMEOUT,
+                pool_timeout=API_POOL_TIMEOUT,
+                http_version=API_HTTP_VERSION,
+            ))
+            .update_queue(asyncio.Queue(maxsize=UPDATE_QUEUE_SIZE))
+            .concurrent_updates(CONCURRENT_UPDATES)
+            .rate_limiter(AIORateLimiter())
+        )
+        if USE_WEBHOOK:
+            # The web server feeds update_queue directly, so no Updater is needed
+            builder = builder.updater(None)
+        else:
+            builder = builder.get_updates_request(HTTPXRequest(
+                connection_pool_size=CONNECTION_POOL_SIZE,
+                http_version=API_HTTP_VERSION,
+            ))
+        self.application = builder.build()
+        
+        # Bind per-user storage before any other handler group runs
+        self.application.add_handler(TypeHandler(Update, prime_user_context), group=-1)
+        
+        # Button presses are the most frequent updates; registered first in the group they
+        # match on the first check instead of after every command handler
         self.application.add_handler(CallbackQueryHandler(callback_query_handler))
         
+        # Register command handlers in one batch
+        self.application.add_handlers([
+            CommandHandler("start", start_handler),
+            CommandHandler("help", help_handler),
+            CommandHandler("settings", settings_handler),
+            
+            # Rename system handlers
+            CommandHandler("autorename", autorename_handler),
+            CommandHandler("preview", preview_handler),
+            CommandHandler("mode", mode_handler),
+            CommandHandler("replace", replace_handler),
+            
+            # File and metadata handlers
+            CommandHandler("metadata", metadata_handler),
+            CommandHandler("setmediatype", setmediatype_handler),
+            CommandHandler("getthumb", getthumb_handler),
+            
+            # Thumbnail management handlers
+            CommandHandler("thumbnail_mode", thumbnail_mode_handler),
+            
+            # Placeholder commands (renamesource, thumbnail uploads per season s01-s10 and
+            # per quality) share one handler so they cost a single dispatch check
+            CommandHandler(("renamesource", "allthumb", "del_thumb") + SEASON_CMDS + QUALITY_CMDS, _noop),
+            
+            # Banner and caption handlers
+            CommandHandler("banner", banner_handler),
+            CommandHandler("caption_mode", caption_mode_handler),
+            
+            # Dump management handlers
+            CommandHandler("dumpsettings", dumpsettings_handler),
+            CommandHandler("deldump", deldump_handler),
+            
+            # Social and premium handlers
+            CommandHandler("leaderboard", leaderboard_handler),
+            CommandHandler("top_referrals", top_referrals_handler),
+            CommandHandler("refer", refer_handler),
+            CommandHandler("premium", premium_handler),
+            CommandHandler("elites", elites_handler),
+            CommandHandler("features", features_handler),
+            CommandHandler("about", about_handler),
+            
+            # Admin handlers
+            CommandHandler("admin_cmd", admin_cmd_handler),
+        ])
+        
+        # File handler
+        # File processing can take seconds, so it must not hold up other updates
+        self.application.add_handler(MessageHandler(FILE_FILTER, file_handler, block=False))
+        
         logger.info("Bot handlers registered successfully")
     
     async def setup_webhook(self):
         """Setup webhook for production deployment"""
-        if WEB_SERVER and WEBHOOK_URL:
+        if USE_WEBHOOK:
+            # aiohttp is only loaded when the bot serves webhooks
+            from aiohttp import web
+            self._web = web
+            
             # Create web application for webhook
             self.web_app = web.Application()
             
@@ -108,91 +170,168 @@ class AutoRenamerBot:
             # Set webhook
             await self.application.bot.set_webhook(
                 url=WEBHOOK_URL + WEBHOOK_PATH,
-                allowed_updates=Update.ALL_TYPES
+                allowed_updates=ALLOWED_UPDATES,
+                secret_token=WEBHOOK_SECRET
             )
             
             logger.info(f"Webhook set to: {WEBHOOK_URL + WEBHOOK_PATH}")
     
     async def webhook_handler(self, request):
         """Handle incoming webhook requests"""
+        web = self._web
+        
+        if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+            return web.Response(status=403)
+        
         try:
-            data = await request.json()
+            data = orjson.loads(await request.read())
             update = Update.de_json(data, self.application.bot)
-            await self.application.process_update(update)
+            # Acknowledge right away; the application's update fetcher processes it
+            self.application.update_queue.put_nowait(update)
             return web.Response(status=200)
+        except asyncio.QueueFull:
+            logger.warning("Update queue full, asking Telegram to retry later")
+            return web.Response(status=429)
         except Exception as e:
             logger.error(f"Error processing webhook: {e}")
             return web.Response(status=500)
     
     async def health_check(self, request):
         """Health check endpoint"""
-        return web.json_response({"status": "healthy", "bot": "auto_renamer"})
+        return self._web.Response(body=_HEALTH_BODY, content_type="application/json")
+    
+    async def cache_bot_identity(self):
+        """Cache what depends on the bot's own account once initialize() has fetched it"""
+        self.application.bot_data["referral_prefix"] = (
+            f"https://t.me/{self.application.bot.username}?start=ref_"
+        )
+    
+    async def flush_writes_loop(self):
+        """Write queued setting changes and file counters to the database in periodic batches"""
+        while True:
+            await asyncio.sleep(SETTINGS_FLUSH_INTERVAL)
+            flush_pending_settings()
+            flush_pending_increments()
+    
+    async def wait_for_stop_signal(self):
+        """Block until SIGINT or SIGTERM so shutdown runs the normal cleanup path"""
+        stop_signal = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop_signal.set)
+            except NotImplementedError:
+                # Windows event loops have no signal handlers; Ctrl+C still interrupts
+                pass
+        await stop_signal.wait()
+        logger.info("Stopping bot...")
     
     async def start_polling(self):
         """Start polling mode for development"""
         logger.info("Starting bot in polling mode...")
         await self.application.initialize()
+        await self.cache_bot_identity()
         await self.application.start()
-        await self.application.updater.start_polling()
+        await self.application.updater.start_polling(allowed_updates=ALLOWED_UPDATES)
+        flush_task = asyncio.create_task(self.flush_writes_loop())
         
         try:
             # Keep the bot running
-            await asyncio.Event().wait()
-        except KeyboardInterrupt:
-            logger.info("Stopping bot...")
+            await self.wait_for_stop_signal()
         finally:
             await self.application.updater.stop()
             await self.application.stop()
+            flush_task.cancel()
+            flush_pending_settings()
+            flush_pending_increments()
             await self.application.shutdown()
     
+    async def run(self):
+        """Serve webhooks when a public URL is configured, otherwise fall back to polling"""
+        if USE_WEBHOOK:
+            await self.setup_webhook()
+            await self.start_webhook()
+        else:
+            await self.start_polling()
+    
     async def start_webhook(self):
         """Start webhook mode for production"""
+        web = self._web
+        
         logger.info(f"Starting bot in webhook mode on {HOST}:{PORT}")
         await self.application.initialize()
+        await self.cache_bot_identity()
         await self.application.start()
         
         # Create and start web server
-        runner = web.AppRunner(self.web_app)
+        # No access log: formatting a line per webhook call is pure overhead
+        runner = web.AppRunner(self.web_app, access_log=None)
         await runner.setup()
         site = web.TCPSite(runner, HOST, PORT)
         await site.start()
+        flush_task = asyncio.create_task(self.flush_writes_loop())
         
         logger.info(f"Bot server started on http://{HOST}:{PORT}")
         
         try:
             # Keep the server running
-            await asyncio.Event().wait()
-        except KeyboardInterrupt:
-            logger.info("Stopping bot...")
+            await self.wait_for_stop_signal()
         finally:
+            # Stop accepting webhooks first so every acknowledged update is still processed
+            await runner.cleanup()
             await self.application.stop()
+            flush_task.cancel()
+            flush_pending_settings()
+            flush_pending_increments()
             await self.application.shutdown()
-            await runner.cleanup()
 
-async def main():
-    """Main entry point"""
-    # Setup logging
+@contextmanager
+def queued_logging():
+    """Log through a queue for the duration of the block
+    
+    The event loop only enqueues records; a background thread formats and
+    writes them to LOG_FILE and the console. Afterwards the same handlers are
+    attached directly, so errors logged during shutdown are still written.
+    """
+    formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    output_handlers = [logging.FileHandler(LOG_FILE), logging.StreamHandler()]
+    for handler in output_handlers:
+        handler.setFormatter(formatter)
+    log_queue = queue.SimpleQueue()
+    listener = QueueListener(log_queue, *output_handlers)
     logging.basicConfig(
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        format='%(message)s',  # the listener's handlers apply the full format
         level=getattr(logging, LOG_LEVEL.upper(), logging.INFO),
-        handlers=[
-            logging.FileHandler(LOG_FILE),
-            logging.StreamHandler()
-        ]
+        handlers=[QueueHandler(log_queue)],
+        force=True
     )
+    logging.getLogger("aiohttp.access").setLevel(logging.WARNING)
+    listener.start()
     
-    # Create bot instance
-    bot = AutoRenamerBot()
-    
-    # Setup application
-    await bot.setup_application()
-    
-    # Start bot based on configuration
-    if WEB_SERVER:
-        await bot.setup_webhook()
-        await bot.start_webhook()
-    else:
-        await bot.start_polling()
+    try:
+        yield
+    finally:
+        # Flush whatever is still queued
+        listener.stop()
+        logging.getLogger().handlers[:] = output_handlers
+
+async def main():
+    """Main entry point"""
+    with queued_logging():
+        # Create bot instance
+        bot = AutoRenamerBot()
+        
+        # Setup application
+        await bot.setup_application()
+        
+        # Start bot based on configuration
+        await bot.run()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    try:
+        # libuv-based event loop, installed with the "speed" extra (not available on Windows)
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
\ No newline at end of file
@@ -3,409 +3,665 @@ User data storage and management for the Telegram Auto Renamer Bot
 Handles user settings, preferences, and statistics
 """
 
-import json
+import logging
 import sqlite3
-from datetime import datetime, timedelta
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-from config import DATABASE_URL
+import orjson
+
+from config import DATABASE_URL, LEADERBOARD_CACHE_TTL
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = "bot_data.db"
+
+# One connection shared by every storage object. Handlers run on the event
+# loop thread and file processing calls in from worker threads, so it is only
+# ever used under _db_lock.
+_connection: Optional[sqlite3.Connection] = None
+_db_lock = threading.Lock()
+
+_CONNECTION_PRAGMAS = """
+    PRAGMA journal_mode=WAL;
+    PRAGMA synchronous=NORMAL;
+    PRAGMA temp_store=MEMORY;
+    PRAGMA cache_size=-65536;
+    PRAGMA mmap_size=268435456;
+    PRAGMA busy_timeout=5000;
+"""
+
+def _create_schema(conn: sqlite3.Connection):
+    """Create the tables and indexes if they do not exist yet"""
+    cursor = conn.cursor()
+    
+    # Users table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            first_name TEXT,
+            settings TEXT,
+            is_premium BOOLEAN DEFAULT 0,
+            premium_until TIMESTAMP,
+            files_processed INTEGER DEFAULT 0,
+            referrals INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    
+    # Partial indexes in the order the leaderboard, referral and elite lists read them
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_files
+        ON users (files_processed DESC) WHERE files_processed > 0
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_refs
+        ON users (referrals DESC) WHERE referrals > 0
+    """)
+    cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_premium
+        ON users (premium_until DESC) WHERE is_premium = 1
+    """)
+    
+    # Settings table for detailed configuration
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_settings (
+            user_id INTEGER PRIMARY KEY,
+            rename_mode TEXT DEFAULT 'autorename',
+            template TEXT DEFAULT '',
+            thumbnail_mode TEXT DEFAULT 'normal',
+            caption_mode TEXT DEFAULT 'Normal',
+            banner_enabled BOOLEAN DEFAULT 0,
+            banner_image TEXT DEFAULT '',
+            banner_position TEXT DEFAULT 'START',
+            banner_link TEXT DEFAULT '',
+            dump_enabled BOOLEAN DEFAULT 0,
+            dump_channel TEXT DEFAULT '',
+            forwarding_mode TEXT DEFAULT 'disabled',
+            replace_rules TEXT DEFAULT '{}',
+            metadata TEXT DEFAULT '{}',
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    """)
+    
+    # Analytics table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS user_analytics (
+            user_id INTEGER PRIMARY KEY,
+            total_files INTEGER DEFAULT 0,
+            files_today INTEGER DEFAULT 0,
+            last_file_date DATE,
+            favorite_format TEXT DEFAULT '',
+            processing_time REAL DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    """)
+    
+    # Referrals table
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS referrals (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            referrer_id INTEGER,
+            referred_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (referrer_id) REFERENCES users (user_id),
+            FOREIGN KEY (referred_id) REFERENCES users (user_id)
+        )
+    """)
+    
+    # One row per referrer/referred pair, looked up by add_referral. Databases
+    # from before the index may hold duplicates, which would make it fail
+    cursor.execute("""
+        DELETE FROM referrals
+        WHERE rowid NOT IN (
+            SELECT MIN(rowid) FROM referrals GROUP BY referrer_id, referred_id
+        )
+    """)
+    cursor.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_refs_pair
+        ON referrals (referrer_id, referred_id)
+    """)
+    
+    conn.commit()
+
+@contextmanager
+def _locked_connection():
+    """Hold the shared connection for one operation, rolling back if it fails"""
+    global _connection
+    with _db_lock:
+        if _connection is None:
+            # A statement cache large enough for every query below, plus
+            # the per-column-set UPDATEs built by flush_pending_settings
+            conn = sqlite3.connect(DB_PATH, check_same_thread=False, cached_statements=256)
+            try:
+                # WAL with synchronous=NORMAL: commits append to the log without an fsync each
+                conn.executescript(_CONNECTION_PRAGMAS)
+                _create_schema(conn)
+            except BaseException:
+                # Retried on the next call instead of reusing a half-initialized connection
+                conn.close()
+                raise
+            _connection = conn
+        try:
+            yield _connection
+        except BaseException:
+            _connection.rollback()
+            raise
+
+# UPDATE ... RETURNING needs SQLite 3.35+
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Columns of user_settings that get_setting()/set_setting() may use, and those stored as JSON
+_SETTING_COLUMNS = frozenset({
+    'rename_mode', 'template', 'thumbnail_mode', 'caption_mode',
+    'banner_enabled', 'banner_image', 'banner_position', 'banner_link',
+    'dump_enabled', 'dump_channel', 'forwarding_mode', 'replace_rules', 'metadata'
+})
+_JSON_COLUMNS = frozenset({'replace_rules', 'metadata'})
+
+# Setting changes waiting for flush_pending_settings(), keyed by user id.
+# Read from worker threads while the flush swaps it on the loop thread, hence
+# the lock; it also guards the per-user settings caches. Taken after _db_lock
+# when both are needed. The flush swaps and writes under both, so a reader
+# holding _db_lock sees a change either still pending or already stored.
+_pending_settings: Dict[int, Dict[str, Any]] = defaultdict(dict)
+_settings_lock = threading.Lock()
+
+# Processed-file counts waiting for flush_pending_increments(), keyed by user id.
+# Incremented from file processing threads, hence the lock.
+_pending_increments: Dict[int, int] = defaultdict(int)
+_increments_lock = threading.Lock()
 
 class UserStorage:
     """Individual user storage manager"""
     
     def __init__(self, user_id: int):
         self.user_id = user_id
-        self.db_path = "bot_data.db"
-        self._init_database()
-    
-    def _init_database(self):
-        """Initialize SQLite database with required tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                first_name TEXT,
-                settings TEXT,
-                is_premium BOOLEAN DEFAULT 0,
-                premium_until TIMESTAMP,
-                files_processed INTEGER DEFAULT 0,
-                referrals INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Settings table for detailed configuration
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_settings (
-                user_id INTEGER PRIMARY KEY,
-                rename_mode TEXT DEFAULT 'autorename',
-                template TEXT DEFAULT '',
-                thumbnail_mode TEXT DEFAULT 'normal',
-                caption_mode TEXT DEFAULT 'Normal',
-                banner_enabled BOOLEAN DEFAULT 0,
-                banner_image TEXT DEFAULT '',
-                banner_position TEXT DEFAULT 'START',
-                banner_link TEXT DEFAULT '',
-                dump_enabled BOOLEAN DEFAULT 0,
-                dump_channel TEXT DEFAULT '',
-                forwarding_mode TEXT DEFAULT 'disabled',
-                replace_rules TEXT DEFAULT '{}',
-                metadata TEXT DEFAULT '{}',
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        """)
-        
-        # Analytics table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_analytics (
-                user_id INTEGER PRIMARY KEY,
-                total_files INTEGER DEFAULT 0,
-                files_today INTEGER DEFAULT 0,
-                last_file_date DATE,
-                favorite_format TEXT DEFAULT '',
-                processing_time REAL DEFAULT 0,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        """)
-        
-        # Referrals table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS referrals (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                referrer_id INTEGER,
-                referred_id INTEGER,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (referrer_id) REFERENCES users (user_id),
-                FOREIGN KEY (referred_id) REFERENCES users (user_id)
-            )
-        """)
-        
-        conn.commit()
-        conn.close()
+        # Last settings read, reused until one of this user's rows is written
+        self._settings_cache: Optional[Dict[str, Any]] = None
+        # Set once this user's rows are known to exist
+        self._initialized = False
     
     def initialize_user(self, user_id: int, first_name: str, username: str = ""):
-        """Initialize a new user in the database"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        """Initialize a new user in the database (all rows in one transaction)"""
+        if self._initialized and user_id == self.user_id:
+            return
         
+        self._settings_cache = None
         try:
-            # Insert user
-            cursor.execute("""
-                INSERT OR IGNORE INTO users (user_id, username, first_name)
-                VALUES (?, ?, ?)
-            """, (user_id, username, first_name))
-            
-            # Insert default settings
-            cursor.execute("""
-                INSERT OR IGNORE INTO user_settings (user_id)
-                VALUES (?)
-            """, (user_id,))
-            
-            # Insert default analytics
-            cursor.execute("""
-                INSERT OR IGNORE INTO user_analytics (user_id)
-                VALUES (?)
-            """, (user_id,))
-            
-            conn.commit()
+            with _locked_connection() as conn:
+                cursor = conn.cursor()
+                
+                # Insert user
+                cursor.execute("""
+                    INSERT OR IGNORE INTO users (user_id, username, first_name)
+                    VALUES (?, ?, ?)
+                """, (user_id, username, first_name))
+                
+                # Insert default settings
+                cursor.execute("""
+                    INSERT OR IGNORE INTO user_settings (user_id)
+                    VALUES (?)
+                """, (user_id,))
+                
+                # Insert default analytics
+                cursor.execute("""
+                    INSERT OR IGNORE INTO user_analytics (user_id)
+                    VALUES (?)
+                """, (user_id,))
+                
+                conn.commit()
+                self._initialized = user_id == self.user_id
         except sqlite3.Error as e:
-            print(f"Database error: {e}")
-        finally:
-            conn.close()
+            logger.error("Database error: %s", e)
     
     def get_user_settings(self) -> Dict[str, Any]:
         """Get user settings and preferences"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with _settings_lock:
+            if self._settings_cache is not None:
+                return self._settings_cache
         
         try:
-            cursor.execute("""
-                SELECT us.*, u.is_premium, u.premium_until, u.files_processed
-                FROM user_settings us
-                LEFT JOIN users u ON us.user_id = u.user_id
-                WHERE us.user_id = ?
-            """, (self.user_id,))
-            
-            row = cursor.fetchone()
-            if not row:
-                return {}
-            
-            # Convert row to dictionary
-            columns = [desc[0] for desc in cursor.description]
-            settings = dict(zip(columns, row))
-            
-            # Parse JSON fields
-            settings['replace_rules'] = json.loads(settings.get('replace_rules', '{}'))
-            settings['metadata'] = json.loads(settings.get('metadata', '{}'))
-            
-            return settings
-            
+            with _locked_connection() as conn, _settings_lock:
+                if self._settings_cache is not None:
+                    return self._settings_cache
+                
+                cursor = conn.cursor()
+                # Named rows for this query only; the other queries keep plain tuples
+                cursor.row_factory = sqlite3.Row
+                
+                cursor.execute("""
+                    SELECT us.*, u.is_premium, u.premium_until, u.files_processed
+                    FROM user_settings us
+                    LEFT JOIN users u ON us.user_id = u.user_id
+                    WHERE us.user_id = ?
+                """, (self.user_id,))
+                
+                row = cursor.fetchone()
+                if not row:
+                    return {}
+                
+                settings = dict(row)
+                
+                # Parse JSON fields
+                for key in _JSON_COLUMNS:
+                    settings[key] = orjson.loads(settings[key] or '{}')
+                
+                settings['files_processed'] = (
+                    (settings.get('files_processed') or 0) + _pending_increments.get(self.user_id, 0)
+                )
+                
+                # Changes not yet flushed are newer than the stored row
+                settings.update(_pending_settings.get(self.user_id, ()))
+                self._settings_cache = settings
+                return settings
+                
         except sqlite3.Error as e:
-            print(f"Database error: {e}")
+            logger.error("Database error: %s", e)
             return {}
-        finally:
-            conn.close()
     
-    def set_setting(self, key: str, value: Any):
-        """Set a specific user setting"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def get_setting(self, key: str, default: Any = None) -> Any:
+        """Get one user setting without loading the whole settings row"""
+        if key not in _SETTING_COLUMNS:
+            raise ValueError(f"Unknown setting: {key}")
         
         try:
-            # Handle JSON fields
-            if key in ['replace_rules', 'metadata']:
-                value = json.dumps(value)
-            
-            cursor.execute(f"""
-                UPDATE user_settings
-                SET {key} = ?
-                WHERE user_id = ?
-            """, (value, self.user_id))
-            
-            conn.commit()
+            with _locked_connection() as conn:
+                with _settings_lock:
+                    if self._settings_cache is not None:
+                        return self._settings_cache.get(key, default)
+                    
+                    pending = _pending_settings.get(self.user_id)
+                    if pending and key in pending:
+                        return pending[key]
+                
+                cursor = conn.cursor()
+                
+                # key is one of _SETTING_COLUMNS, so it is safe to interpolate
+                cursor.execute(f"""
+                    SELECT {key} FROM user_settings WHERE user_id = ?
+                """, (self.user_id,))
+                
+                row = cursor.fetchone()
+                if not row:
+                    return default
+                
+                return orjson.loads(row[0] or '{}') if key in _JSON_COLUMNS else row[0]
+                
         except sqlite3.Error as e:
-            print(f"Database error: {e}")
-        finally:
-            conn.close()
+            logger.error("Database error: %s", e)
+            return default
     
-    def set_replace_rule(self, old_text: str, new_text: str):
-        """Set a text replacement rule"""
-        settings = self.get_user_settings()
-        replace_rules = settings.get('replace_rules', {})
-        replace_rules[old_text] = new_text
-        self.set_setting('replace_rules', replace_rules)
-    
-    def increment_files_processed(self):
-        """Increment the user's file processing counter"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+    def set_setting(self, key: str, value: Any):
+        """Set a specific user setting; it is written on the next flush_pending_settings()"""
+        if key not in _SETTING_COLUMNS:
+            raise ValueError(f"Unknown setting: {key}")
         
+        with _settings_lock:
+            _pending_settings[self.user_id][key] = value
+            if self._settings_cache is not None:
+                self._settings_cache[key] = value
+    
+    def set_replace_rule(self, old_text: str, new_text: str):
+        """Set a text replacement rule, patching the stored JSON in place"""
         try:
-            # Update user stats
-            cursor.execute("""
-                UPDATE users
-                SET files_processed = files_processed + 1,
-                    last_active = CURRENT_TIMESTAMP
-                WHERE user_id = ?
-            """, (self.user_id,))
-            
-            # Update analytics
-            today = datetime.now().date()
-            cursor.execute("""
-                UPDATE user_analytics
-                SET total_files = total_files + 1,
-                    files_today = CASE 
-                        WHEN last_file_date = ? THEN files_today + 1
-                        ELSE 1
-                    END,
-                    last_file_date = ?
-                WHERE user_id = ?
-            """, (today, today, self.user_id))
-            
-            conn.commit()
+            with _locked_connection() as conn:
+                with _settings_lock:
+                    if self._settings_cache is not None:
+                        self._settings_cache['replace_rules'][old_text] = new_text
+                    
+                    pending = _pending_settings.get(self.user_id)
+                    if pending and 'replace_rules' in pending:
+                        # A queued full value would overwrite the patch on the next flush
+                        pending['replace_rules'][old_text] = new_text
+                        return
+                
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    UPDATE user_settings
+                    SET replace_rules = json_patch(
+                        COALESCE(NULLIF(replace_rules, ''), '{}'), json_object(?, ?)
+                    )
+                    WHERE user_id = ?
+                """, (old_text, new_text, self.user_id))
+                
+                conn.commit()
         except sqlite3.Error as e:
-            print(f"Database error: {e}")
-        finally:
-            conn.close()
+            logger.error("Database error: %s", e)
+    
+    def increment_files_processed(self):
+        """Count a processed file; it is written on the next flush_pending_increments()"""
+        with _increments_lock:
+            _pending_increments[self.user_id] += 1
+        self._settings_cache = None
     
     def add_premium_time(self, hours: int):
         """Add premium time to user account"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
+        self._settings_cache = None
         try:
-            # Get current premium status
-            cursor.execute("""
-                SELECT premium_until FROM users WHERE user_id = ?
-            """, (self.user_id,))
-            
-            row = cursor.fetchone()
-            current_premium = row[0] if row and row[0] else datetime.now()
-            
-            # Add hours to premium time
-            if isinstance(current_premium, str):
-                current_premium = datetime.fromisoformat(current_premium)
-            
-            new_premium_until = current_premium + timedelta(hours=hours)
-            
-            cursor.execute("""
-                UPDATE users
-                SET is_premium = 1,
-                    premium_until = ?
-                WHERE user_id = ?
-            """, (new_premium_until, self.user_id))
-            
-            conn.commit()
-            return new_premium_until
-            
+            with _locked_connection() as conn:
+                cursor = conn.cursor()
+                
+                # Extend from the later of the current expiry and now in one statement,
+                # so concurrent grants cannot both start from the same base time
+                cursor.execute(f"""
+                    UPDATE users
+                    SET is_premium = 1,
+                        premium_until = datetime(
+                            MAX(COALESCE(premium_until, CURRENT_TIMESTAMP), CURRENT_TIMESTAMP), ?
+                        )
+                    WHERE user_id = ?
+                    {"RETURNING premium_until" if _HAS_RETURNING else ""}
+                """, (f"+{hours} hours", self.user_id))
+                
+                if not _HAS_RETURNING:
+                    cursor.execute("""
+                        SELECT premium_until FROM users WHERE user_id = ?
+                    """, (self.user_id,))
+                row = cursor.fetchone()
+                new_premium_until = datetime.fromisoformat(row[0]) if row else None
+                
+                conn.commit()
+                GLOBAL_STORAGE.invalidate_cached('total_stats')
+                return new_premium_until
+                
         except sqlite3.Error as e:
-            print(f"Database error: {e}")
+            logger.error("Database error: %s", e)
             return None
-        finally:
-            conn.close()
 
 class GlobalStorage:
     """Global storage for leaderboards and statistics"""
     
     def __init__(self):
-        self.db_path = "bot_data.db"
+        self._query_cache: Dict[Tuple[str, int], Tuple[float, Any]] = {}
+        # Called with the query name whenever its cached results are dropped
+        self._invalidation_listeners: List[Callable[[str], None]] = []
+    
+    def _get_cached(self, key: Tuple[str, int]) -> Optional[Any]:
+        """Return a cached query result if it is younger than LEADERBOARD_CACHE_TTL"""
+        entry = self._query_cache.get(key)
+        if entry and time.monotonic() - entry[0] < LEADERBOARD_CACHE_TTL:
+            return entry[1]
+        return None
+    
+    def _set_cached(self, key: Tuple[str, int], rows: Any) -> Any:
+        """Store a query result in the TTL cache"""
+        self._query_cache[key] = (time.monotonic(), rows)
+        return rows
+    
+    def invalidate_cached(self, name: str):
+        """Drop cached results of one query, e.g. 'leaderboard', for every limit"""
+        for key in [key for key in self._query_cache if key[0] == name]:
+            del self._query_cache[key]
+        for listener in self._invalidation_listeners:
+            listener(name)
+    
+    def add_invalidation_listener(self, listener: Callable[[str], None]):
+        """Also drop caches derived from query results, e.g. rendered texts"""
+        self._invalidation_listeners.append(listener)
     
     def get_leaderboard(self, limit: int = 10) -> List[Tuple[int, str, int]]:
         """Get top users by files processed"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cached = self._get_cached(('leaderboard', limit))
+        if cached is not None:
+            return cached
         
         try:
-            cursor.execute("""
-                SELECT user_id, COALESCE(first_name, username, 'User'), files_processed
-                FROM users
-                WHERE files_processed > 0
-                ORDER BY files_processed DESC
-                LIMIT ?
-            """, (limit,))
-            
-            return cursor.fetchall()
-            
+            with _locked_connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    SELECT user_id, COALESCE(first_name, username, 'User'), files_processed
+                    FROM users
+                    WHERE files_processed > 0
+                    ORDER BY files_processed DESC
+                    LIMIT ?
+                """, (limit,))
+                
+                return self._set_cached(('leaderboard', limit), cursor.fetchall())
+                
         except sqlite3.Error as e:
-            print(f"Database error: {e}")
+            logger.error("Database error: %s", e)
             return []
-        finally:
-            conn.close()
     
     def get_top_referrals(self, limit: int = 10) -> List[Tuple[int, str, int]]:
         """Get top users by referrals"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cached = self._get_cached(('top_referrals', limit))
+        if cached is not None:
+            return cached
         
         try:
-            cursor.execute("""
-                SELECT u.user_id, COALESCE(u.first_name, u.username, 'User'), u.referrals
-                FROM users u
-                WHERE u.referrals > 0
-                ORDER BY u.referrals DESC
-                LIMIT ?
-            """, (limit,))
-            
-            return cursor.fetchall()
-            
+            with _locked_connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    SELECT u.user_id, COALESCE(u.first_name, u.username, 'User'), u.referrals
+                    FROM users u
+                    WHERE u.referrals > 0
+                    ORDER BY u.referrals DESC
+                    LIMIT ?
+                """, (limit,))
+                
+                return self._set_cached(('top_referrals', limit), cursor.fetchall())
+                
         except sqlite3.Error as e:
-            print(f"Database error: {e}")
+            logger.error("Database error: %s", e)
             return []
-        finally:
-            conn.close()
     
     def get_premium_users(self, limit: int = 20) -> List[Tuple[int, str, str]]:
         """Get premium users list"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cached = self._get_cached(('premium_users', limit))
+        if cached is not None:
+            return cached
         
         try:
-            cursor.execute("""
-                SELECT user_id, COALESCE(first_name, username, 'User'),
-                       CASE 
-                           WHEN premium_until > datetime('now', '+365 days') THEN 'lifetime'
-                           WHEN premium_until > datetime('now', '+30 days') THEN 'yearly'
-                           ELSE 'monthly'
-                       END as tier
-                FROM users
-                WHERE is_premium = 1 AND premium_until > datetime('now')
-                ORDER BY premium_until DESC
-                LIMIT ?
-            """, (limit,))
-            
-            return cursor.fetchall()
+            # Tier cutoffs in SQLite's datetime('now') format, computed once instead of per row
+            now = datetime.now(timezone.utc)
+            yearly, monthly, active = (
+                (now + timedelta(days=days)).strftime("%Y-%m-%d %H:%M:%S") for days in (365, 30, 0)
+            )
             
+            with _locked_connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    SELECT user_id, COALESCE(first_name, username, 'User'),
+                           CASE 
+                               WHEN premium_until > ? THEN 'lifetime'
+                               WHEN premium_until > ? THEN 'yearly'
+                               ELSE 'monthly'
+                           END as tier
+                    FROM users
+                    WHERE is_premium = 1 AND premium_until > ?
+                    ORDER BY premium_until DESC
+                    LIMIT ?
+                """, (yearly, monthly, active, limit))
+                
+                return self._set_cached(('premium_users', limit), cursor.fetchall())
+                
         except sqlite3.Error as e:
-            print(f"Database error: {e}")
+            logger.error("Database error: %s", e)
             return []
-        finally:
-            conn.close()
     
     def add_referral(self, referrer_id: int, referred_id: int):
         """Add a referral relationship"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         try:
-            # Check if referral already exists
-            cursor.execute("""
-                SELECT id FROM referrals 
-                WHERE referrer_id = ? AND referred_id = ?
-            """, (referrer_id, referred_id))
-            
-            if cursor.fetchone():
-                return False  # Referral already exists
-            
-            # Add referral
-            cursor.execute("""
-                INSERT INTO referrals (referrer_id, referred_id)
-                VALUES (?, ?)
-            """, (referrer_id, referred_id))
-            
-            # Update referrer's count
-            cursor.execute("""
-                UPDATE users
-                SET referrals = referrals + 1
-                WHERE user_id = ?
-            """, (referrer_id,))
-            
-            conn.commit()
-            return True
-            
+            with _locked_connection() as conn:
+                cursor = conn.cursor()
+                
+                # idx_refs_pair makes a repeated referral a no-op, even under concurrency
+                cursor.execute("""
+                    INSERT INTO referrals (referrer_id, referred_id)
+                    VALUES (?, ?)
+                    ON CONFLICT DO NOTHING
+                """, (referrer_id, referred_id))
+                
+                if cursor.rowcount == 0:
+                    # End the write transaction the ignored INSERT opened
+                    conn.rollback()
+                    return False  # Referral already exists
+                
+                # Update referrer's count
+                cursor.execute("""
+                    UPDATE users
+                    SET referrals = referrals + 1
+                    WHERE user_id = ?
+                """, (referrer_id,))
+                
+                conn.commit()
+                self.invalidate_cached('total_stats')
+                return True
+                
         except sqlite3.Error as e:
-            print(f"Database error: {e}")
+            logger.error("Database error: %s", e)
             return False
-        finally:
-            conn.close()
     
     def get_total_stats(self) -> Dict[str, int]:
         """Get global bot statistics"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        cached = self._get_cached(('total_stats', 0))
+        if cached is not None:
+            return cached
         
         try:
-            cursor.execute("""
-                SELECT 
-                    COUNT(*) as total_users,
-                    SUM(files_processed) as total_files,
-                    COUNT(CASE WHEN is_premium = 1 THEN 1 END) as premium_users,
-                    SUM(referrals) as total_referrals
-                FROM users
-            """)
+            with _locked_connection() as conn:
+                cursor = conn.cursor()
+                
+                cursor.execute("""
+                    SELECT 
+                        COUNT(*) as total_users,
+                        SUM(files_processed) as total_files,
+                        COUNT(CASE WHEN is_premium = 1 THEN 1 END) as premium_users,
+                        SUM(referrals) as total_referrals
+                    FROM users
+                """)
+                
+                row = cursor.fetchone()
+                if row:
+                    return self._set_cached(('total_stats', 0), {
+                        'total_users': row[0] or 0,
+                        'total_files': row[1] or 0,
+                        'premium_users': row[2] or 0,
+                        'total_referrals': row[3] or 0
+                    })
+                
+                return {'total_users': 0, 'total_files': 0, 'premium_users': 0, 'total_referrals': 0}
+                
+        except sqlite3.Error as e:
+            logger.error("Database error: %s", e)
+            return {'total_users': 0, 'total_files': 0, 'premium_users': 0, 'total_referrals': 0}
+
+def flush_pending_settings():
+    """Write all queued setting changes in a single transaction"""
+    if not _pending_settings:
+        return
+    
+    try:
+        with _locked_connection() as conn, _settings_lock:
+            pending = {}
+            for user_id, values in _pending_settings.items():
+                # Only known columns may be interpolated; anything else is dropped, not retried
+                unknown = values.keys() - _SETTING_COLUMNS
+                if unknown:
+                    logger.error("Dropping unknown settings for %s: %s", user_id, sorted(unknown))
+                    values = {key: value for key, value in values.items() if key in _SETTING_COLUMNS}
+                if values:
+                    pending[user_id] = values
+            _pending_settings.clear()
+            
+            try:
+                cursor = conn.cursor()
+                
+                for user_id, values in pending.items():
+                    # Handle JSON fields
+                    params = [
+                        orjson.dumps(value).decode() if key in _JSON_COLUMNS else value
+                        for key, value in values.items()
+                    ]
+                    assignments = ", ".join(f"{key} = ?" for key in values)
+                    cursor.execute(f"""
+                        UPDATE user_settings
+                        SET {assignments}
+                        WHERE user_id = ?
+                    """, (*params, user_id))
+                
+                conn.commit()
+            except sqlite3.Error as e:
+                conn.rollback()
+                logger.error("Database error: %s", e)
+                # Requeue the batch; nothing can have been set since while the lock was held
+                _pending_settings.update(pending)
+    except sqlite3.Error as e:
+        logger.error("Database error: %s", e)
+
+def flush_pending_increments():
+    """Write all queued processed-file counts in a single transaction"""
+    with _increments_lock:
+        if not _pending_increments:
+            return
+        pending = dict(_pending_increments)
+        _pending_increments.clear()
+    
+    try:
+        with _locked_connection() as conn:
+            cursor = conn.cursor()
             
-            row = cursor.fetchone()
-            if row:
-                return {
-                    'total_users': row[0] or 0,
-                    'total_files': row[1] or 0,
-                    'premium_users': row[2] or 0,
-                    'total_referrals': row[3] or 0
-                }
+            # Update user stats
+            cursor.executemany("""
+                UPDATE users
+                SET files_processed = files_processed + ?,
+                    last_active = CURRENT_TIMESTAMP
+                WHERE user_id = ?
+            """, [(count, user_id) for user_id, count in pending.items()])
             
-            return {'total_users': 0, 'total_files': 0, 'premium_users': 0, 'total_referrals': 0}
+            # Update analytics
+            today = datetime.now().date()
+            cursor.executemany("""
+                UPDATE user_analytics
+                SET total_files = total_files + ?,
+                    files_today = CASE 
+                        WHEN last_file_date = ? THEN files_today + ?
+                        ELSE ?
+                    END,
+                    last_file_date = ?
+                WHERE user_id = ?
+            """, [(count, today, count, count, today, user_id) for user_id, count in pending.items()])
             
-        except sqlite3.Error as e:
-            print(f"Database error: {e}")
-            return {'total_users': 0, 'total_files': 0, 'premium_users': 0, 'total_referrals': 0}
-        finally:
-            conn.close()
+            conn.commit()
+        # Only now do the stored counts include these files
+        GLOBAL_STORAGE.invalidate_cached('total_stats')
+        GLOBAL_STORAGE.invalidate_cached('leaderboard')
+    except sqlite3.Error as e:
+        logger.error("Database error: %s", e)
+        # Requeue the counts so they are retried on the next flush
+        with _increments_lock:
+            for user_id, count in pending.items():
+                _pending_increments[user_id] += count
 
-# Storage instances
-_user_storages: Dict[int, UserStorage] = {}
-_global_storage = GlobalStorage()
+# Storage instances (least recently used are dropped past MAX_CACHED_STORAGES)
+MAX_CACHED_STORAGES = 1024
+_user_storages: "OrderedDict[int, UserStorage]" = OrderedDict()
+GLOBAL_STORAGE = GlobalStorage()
 
 def get_user_storage(user_id: int) -> UserStorage:
     """Get or create user storage instance"""
     if user_id == 0:  # Special case for global storage
-        return _global_storage
+        return GLOBAL_STORAGE
     
-    if user_id not in _user_storages:
-        _user_storages[user_id] = UserStorage(user_id)
+    storage = _user_storages.get(user_id)
+    if storage is None:
+        storage = _user_storages[user_id] = UserStorage(user_id)
+        if len(_user_storages) > MAX_CACHED_STORAGES:
+            # Pending writes are module-level, so an evicted instance only loses its settings cache
+            _user_storages.popitem(last=False)
+    else:
+        _user_storages.move_to_end(user_id)
     
-    return _user_storages[user_id]
\ No newline at end of file
+    return storage
\ No newline at end of file
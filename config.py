@@ -3,8 +3,12 @@ Configuration file for Telegram Auto Renamer Bot
 Environment variables for customization and deployment
 """
 
+import html
 import os
+import secrets
+from functools import lru_cache
 from pathlib import Path
+from types import MappingProxyType
 
 # Bot Configuration
 BOT_TOKEN = os.getenv("BOT_TOKEN", "")
@@ -13,7 +17,9 @@ if not BOT_TOKEN:
 
 # Bot Appearance
 START_PHOTO = os.getenv("START_PHOTO", "https://via.placeholder.com/800x400?text=Auto+Renamer+Bot")
-CUSTOM_WELCOME_MSG = os.getenv("CUSTOM_WELCOME_MSG", 
+# Messages are sent as HTML, so a message from the environment is escaped to stay plain text
+_welcome_env = os.getenv("CUSTOM_WELCOME_MSG")
+CUSTOM_WELCOME_MSG = html.escape(_welcome_env, quote=False) if _welcome_env is not None else (
     "🤖 Welcome to Auto Renamer Bot!\n\n"
     "I can help you rename files up to 5GB with advanced features:\n"
     "• Custom templates with variables\n"
@@ -31,6 +37,8 @@ HOST = "0.0.0.0" if WEB_SERVER else "127.0.0.1"
 # Webhook Configuration (for deployment)
 WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
 WEBHOOK_PATH = f"/webhook/{BOT_TOKEN}"
+# Sent back by Telegram on every webhook call; generated per run when not configured
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
 
 # File Configuration
 MAX_FILE_SIZE = 5 * 1024 * 1024 * 1024  # 5GB in bytes
@@ -38,13 +46,24 @@ DOWNLOAD_PATH = Path("downloads")
 TEMP_PATH = Path("temp")
 THUMBNAILS_PATH = Path("thumbnails")
 
-# Create directories
-DOWNLOAD_PATH.mkdir(exist_ok=True)
-TEMP_PATH.mkdir(exist_ok=True)
-THUMBNAILS_PATH.mkdir(exist_ok=True)
+# Directories are created on first use rather than at import
+@lru_cache(maxsize=None)
+def _ensure_dir(path: Path) -> Path:
+    path.mkdir(exist_ok=True)
+    return path
+
+def download_path() -> Path:
+    return _ensure_dir(DOWNLOAD_PATH)
+
+def temp_path() -> Path:
+    return _ensure_dir(TEMP_PATH)
+
+def thumbnails_path() -> Path:
+    return _ensure_dir(THUMBNAILS_PATH)
 
 # Database Configuration
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///bot_data.db")
+SETTINGS_FLUSH_INTERVAL = 0.5  # seconds between batched writes of changed settings and file counts
 
 # Premium System
 PREMIUM_FEATURES = {
@@ -60,7 +79,7 @@ REFERRAL_BONUS_HOURS = 3
 REFERRAL_POINTS_PER_USER = 10
 
 # Admin Configuration
-ADMIN_IDS = [int(x.strip()) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip()]
+ADMIN_IDS = frozenset(int(x.strip()) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip())
 
 # Logging Configuration
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
@@ -70,6 +89,9 @@ LOG_FILE = os.getenv("LOG_FILE", "bot.log")
 MAX_REQUESTS_PER_MINUTE = 30
 MAX_FILE_UPLOADS_PER_HOUR = 50
 
+# Caching
+LEADERBOARD_CACHE_TTL = 30  # seconds leaderboard/referral/elite lists are reused
+
 # Template Variables
 DEFAULT_VARIABLES = [
     "title", "season", "episode", "audio", "quality", 
@@ -99,33 +121,57 @@ QUALITY_OPTIONS = [
 # Season Options
 SEASON_OPTIONS = [f"s{i:02d}" for i in range(1, 11)]  # s01 to s10
 
+# Thumbnail upload/delete commands per season and per quality
+SEASON_CMDS = (
+    tuple(f"thums{i:02d}" for i in range(1, 11))
+    + tuple(f"delthumbs{i:02d}" for i in range(1, 11))
+)
+QUALITY_CMDS = (
+    tuple(f"thum{quality[:-1]}" for quality in QUALITY_OPTIONS)
+    + tuple(f"delthum{quality[:-1]}" for quality in QUALITY_OPTIONS)
+)
+
 # Banner Positions
 BANNER_POSITIONS = ["START", "END", "BOTH", "DISABLED"]
+BANNER_POSITION_SET = frozenset(BANNER_POSITIONS)
 
-# File Extensions
-SUPPORTED_VIDEO_EXTENSIONS = [
+# File Extensions (sets, only used for membership tests)
+SUPPORTED_VIDEO_EXTENSIONS = frozenset({
     ".mp4", ".mkv", ".avi", ".mov", ".wmv", ".flv", 
     ".webm", ".m4v", ".3gp", ".ts", ".mts"
-]
+})
 
-SUPPORTED_AUDIO_EXTENSIONS = [
+SUPPORTED_AUDIO_EXTENSIONS = frozenset({
     ".mp3", ".flac", ".wav", ".aac", ".ogg", ".wma", 
     ".m4a", ".opus", ".aiff"
-]
+})
 
-SUPPORTED_DOCUMENT_EXTENSIONS = [
+SUPPORTED_DOCUMENT_EXTENSIONS = frozenset({
     ".pdf", ".doc", ".docx", ".txt", ".rtf", ".odt", 
     ".xls", ".xlsx", ".ppt", ".pptx", ".zip", ".rar"
-]
+})
 
-SUPPORTED_IMAGE_EXTENSIONS = [
+SUPPORTED_IMAGE_EXTENSIONS = frozenset({
     ".jpg", ".jpeg", ".png", ".gif", ".bmp", ".tiff", 
     ".webp", ".svg", ".ico"
-]
+})
 
 # API Configuration
 API_TIMEOUT = 30
 CHUNK_SIZE = 1024 * 1024  # 1MB chunks for file processing
+CONNECTION_POOL_SIZE = 256  # pooled connections to the Bot API, reused across requests
+API_READ_TIMEOUT = 120
+API_WRITE_TIMEOUT = 600
+API_POOL_TIMEOUT = 5.0  # seconds to wait for a free pooled connection
+API_HTTP_VERSION = "2"  # HTTP/2 multiplexes concurrent Bot API calls over one connection
+UPLOAD_MIN_WRITE_TIMEOUT = 60  # seconds, raised for large uploads
+UPLOAD_BYTES_PER_SECOND = 512 * 1024  # slowest upload speed still expected to finish
+MAX_CONCURRENT_UPLOADS = int(os.getenv("MAX_CONCURRENT_UPLOADS", 4))
+MAX_CONCURRENT_FILES = int(os.getenv("MAX_CONCURRENT_FILES", 4))  # renames processed at once
+FILE_PROCESS_TIMEOUT = 3600  # seconds before a single rename is abandoned
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", 256))  # updates handled at once
+UPDATE_QUEUE_SIZE = 1000  # webhook updates waiting to be processed before Telegram gets a 429
+EDIT_INTERVAL = 0.8  # minimum seconds between updates to one message (Telegram allows ~1/s)
 
 # Feature Flags
 FEATURES = {
@@ -141,24 +187,24 @@ FEATURES = {
     "batch_processing": True
 }
 
-# Messages
-MESSAGES = {
+# Messages (read-only so handlers can bind entries once at import)
+MESSAGES = MappingProxyType({
     "start": CUSTOM_WELCOME_MSG,
-    "help": "📚 **Available Commands:**\n\n"
-            "🔧 **Basic Commands:**\n"
+    "help": "📚 <b>Available Commands:</b>\n\n"
+            "🔧 <b>Basic Commands:</b>\n"
             "/start - Start the bot\n"
             "/help - Show this help message\n"
             "/settings - View your settings\n\n"
-            "✏️ **Rename Commands:**\n"
+            "✏️ <b>Rename Commands:</b>\n"
             "/autorename - Set auto-rename template\n"
             "/preview - Preview rename format\n"
             "/mode - Change rename mode\n"
             "/replace - Set text replacement\n\n"
-            "🎨 **Customization:**\n"
+            "🎨 <b>Customization:</b>\n"
             "/banner - Banner control panel\n"
             "/thumbnail_mode - Thumbnail settings\n"
             "/caption_mode - Caption formatting\n\n"
-            "💎 **Premium & Social:**\n"
+            "💎 <b>Premium &amp; Social:</b>\n"
             "/premium - Premium features\n"
             "/refer - Refer friends\n"
             "/leaderboard - Top users\n\n"
@@ -173,4 +219,4 @@ MESSAGES = {
     "error": "❌ An error occurred: {error}",
     "premium_required": "💎 This feature requires premium membership.\nUse /premium to upgrade!",
     "rate_limited": "⏳ Please wait before sending another request.",
-}
\ No newline at end of file
+})
\ No newline at end of file
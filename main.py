@@ -77,22 +77,18 @@ async def main():
             return
         
         # Import and run the actual bot
-        from bot.main import AutoRenamerBot
+        from bot.main import AutoRenamerBot, queued_logging
         
-        logger.info("Starting Telegram Auto Renamer Bot...")
-        
-        # Create and setup bot
-        bot = AutoRenamerBot()
-        await bot.setup_application()
-        
-        # Check if running in web server mode
-        web_server = os.getenv("WEB_SERVER", "false").lower() == "true"
-        
-        if web_server:
-            await bot.setup_webhook()
-            await bot.start_webhook()
-        else:
-            await bot.start_polling()
+        # Same non-blocking file and console logging as bot/main.py
+        with queued_logging():
+            logger.info("Starting Telegram Auto Renamer Bot...")
+            
+            # Create and setup bot
+            bot = AutoRenamerBot()
+            await bot.setup_application()
+            
+            # Webhook mode when WEB_SERVER and WEBHOOK_URL are configured, polling otherwise
+            await bot.run()
             
     except KeyboardInterrupt:
         logger.info("Bot stopped by user")
@@ -101,4 +97,10 @@ async def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    try:
+        # libuv-based event loop, installed with the "speed" extra (not available on Windows)
+        import uvloop
+    except ImportError:
+        asyncio.run(main())
+    else:
+        uvloop.run(main())
\ No newline at end of file
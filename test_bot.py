@@ -13,6 +13,263 @@ from pathlib import Path
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
+async def test_template_engine():
+    """Template variables are substituted"""
+    from utils.template_engine import TemplateEngine
+    
+    engine = TemplateEngine()
+    template = "S{season} E{episode} - {title} [{audio}] {quality}"
+    variables = {
+        'season': '01',
+        'episode': '05', 
+        'title': 'Sample Movie',
+        'audio': 'AAC',
+        'quality': '1080p'
+    }
+    result = engine.apply_template(template, variables)
+    expected = "S01 E05 - Sample Movie [AAC] 1080p"
+    assert result == expected, f"Expected '{expected}', got '{result}'"
+    
+    # Braces in substituted values are dropped like unknown variables
+    assert engine.apply_template("{title} {year}", {'title': 'Movie {2020}', 'year': '2020'}) == "Movie 2020"
+    
+    # Stray and doubled braces render as they did before templates were compiled
+    assert engine.apply_template("{a {title}", {'title': 'Movie'}) == "{a Movie"
+    assert engine.apply_template("{title}}", {'title': 'Movie'}) == "Movie}"
+    assert engine.apply_template("{{title}", {'title': 'Movie'}) == "{Movie"
+    assert engine.apply_template("{{title}}", {'title': 'Movie'}) == "renamed_file"
+    assert engine.apply_template("{a {unknown} b", {}) == "b"
+    
+    # Saved templates keep validating: braces only need to balance in count
+    assert engine.validate_template("}{")["valid"]
+    assert engine.validate_template("{title}}{")["variables"] == ['title']
+    assert engine.validate_template("{title")["error"] == "Unbalanced braces"
+    assert not engine.validate_template("{1x}")["valid"]
+    return f"Template processing: {result}"
+
+async def test_banner_manager():
+    """Banner positions and banner creation"""
+    from utils.banner_manager import BannerManager
+    
+    banner_mgr = BannerManager()
+    positions = banner_mgr.get_banner_positions()
+    assert 'START' in positions
+    assert 'END' in positions
+    assert 'BOTH' in positions
+    assert 'DISABLED' in positions
+    
+    # Test banner creation
+    banner_data = banner_mgr.create_banner("Test Banner", "https://example.com")
+    assert len(banner_data) > 0, "Banner data should not be empty"
+    
+    # Blank canvases for arbitrary sizes must not accumulate without bound
+    for width in range(10, 10 + 2 * BannerManager.MAX_CACHED_BLANKS):
+        banner_mgr.create_banner("", width=width, height=10)
+    assert len(BannerManager._blanks) <= BannerManager.MAX_CACHED_BLANKS
+    return "Banner management functional"
+
+def _check_storage():
+    """Blocking SQLite checks, run off the event loop by test_storage"""
+    from bot.storage import UserStorage, GlobalStorage, flush_pending_settings
+    
+    # Test user storage
+    user_storage = UserStorage(12345)
+    user_storage.initialize_user(12345, "Test User", "testuser")
+    
+    # Test settings
+    user_storage.set_setting("rename_mode", "AUTO")
+    user_storage.set_setting("caption_mode", "BOLD")
+    user_storage.set_setting("banner_position", "START")
+    
+    settings = user_storage.get_user_settings()
+    assert settings['rename_mode'] == 'AUTO'
+    assert settings['caption_mode'] == 'BOLD'
+    assert settings['banner_position'] == 'START'
+    
+    # Queued settings must reach the database on flush
+    flush_pending_settings()
+    assert UserStorage(12345).get_user_settings()['rename_mode'] == 'AUTO'
+    
+    # Unknown keys are rejected, and one that slips into the queue is dropped without blocking the rest
+    from bot import storage
+    try:
+        user_storage.set_setting("rename_mode = 'x' --", "AUTO")
+        assert False, "Unknown setting accepted"
+    except ValueError:
+        pass
+    user_storage.set_setting("caption_mode", "ITALIC")
+    storage._pending_settings[12345]["no_such_column"] = 1
+    flush_pending_settings()
+    assert not storage._pending_settings
+    assert UserStorage(12345).get_setting("caption_mode") == 'ITALIC'
+    
+    # Test global storage
+    global_storage = GlobalStorage()
+    stats = global_storage.get_total_stats()
+    assert isinstance(stats, dict)
+    
+    # Flushed file counts must show up in an already cached leaderboard
+    from bot.storage import GLOBAL_STORAGE, flush_pending_increments
+    def files_of(user_id):
+        return {uid: count for uid, _, count in GLOBAL_STORAGE.get_leaderboard(1000)}.get(user_id, 0)
+    before = files_of(12345)
+    user_storage.increment_files_processed()
+    flush_pending_increments()
+    assert files_of(12345) == before + 1
+    
+    # Premium extends from the current expiry while active, and from now once expired
+    from datetime import datetime, timedelta, timezone
+    from bot.storage import _locked_connection
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    with _locked_connection() as conn:
+        conn.execute("UPDATE users SET premium_until = NULL WHERE user_id = 12345")
+        conn.commit()
+    first = user_storage.add_premium_time(2)
+    assert abs(first - (now + timedelta(hours=2))) < timedelta(minutes=1)
+    assert user_storage.add_premium_time(3) == first + timedelta(hours=3)
+    with _locked_connection() as conn:
+        conn.execute("UPDATE users SET premium_until = '2000-01-01 00:00:00' WHERE user_id = 12345")
+        conn.commit()
+    renewed = user_storage.add_premium_time(1)
+    assert abs(renewed - (now + timedelta(hours=1))) < timedelta(minutes=1)
+    
+    # A repeated referral is ignored and must not leave a write transaction open
+    global_storage.add_referral(12345, 54321)
+    assert global_storage.add_referral(12345, 54321) is False
+    assert not storage._connection.in_transaction
+
+async def test_storage():
+    """Settings round-trip through the database"""
+    # The only test touching bot_data.db, so its steps stay sequential
+    await asyncio.to_thread(_check_storage)
+    
+    # A setting written on the loop is seen by worker threads even while it is flushed
+    from bot.storage import UserStorage, flush_pending_settings
+    loop = asyncio.get_running_loop()
+    user_storage = UserStorage(12345)
+    for mode in ("MANUAL", "AUTO") * 25:
+        user_storage.set_setting("rename_mode", mode)
+        reads = [
+            loop.run_in_executor(None, lambda: UserStorage(12345).get_setting("rename_mode")),
+            loop.run_in_executor(None, lambda: UserStorage(12345).get_user_settings()["rename_mode"]),
+        ]
+        flush_pending_settings()
+        assert await asyncio.gather(*reads) == [mode, mode]
+    return "Storage system functional"
+
+async def test_keyboards():
+    """Every menu keyboard has buttons"""
+    from bot import keyboards
+    
+    keyboard_funcs = [
+        keyboards.get_main_menu_keyboard,
+        keyboards.get_rename_settings_keyboard,
+        keyboards.get_banner_keyboard,
+        keyboards.get_premium_keyboard,
+        keyboards.get_caption_mode_keyboard
+    ]
+    
+    for func in keyboard_funcs:
+        keyboard = func()
+        assert hasattr(keyboard, 'inline_keyboard')
+        assert len(keyboard.inline_keyboard) > 0
+    
+    # A caller modifying a serialized keyboard must not change later sends of it
+    payload = keyboards.MAIN_MENU_KB.to_dict()
+    payload["inline_keyboard"][0].clear()
+    assert keyboards.MAIN_MENU_KB.to_dict()["inline_keyboard"][0]
+    
+    # Old underscore-style callback data still maps onto current setting callbacks
+    from bot.handlers import _LEGACY_CALLBACKS
+    current = {
+        button.callback_data
+        for func in (keyboards.get_caption_mode_keyboard, keyboards.get_banner_keyboard)
+        for row in func().inline_keyboard for button in row
+    }
+    assert _LEGACY_CALLBACKS["rename_mode_manual"] == "rename_mode:manual"
+    assert _LEGACY_CALLBACKS["caption_mode_bold"] in current
+    assert _LEGACY_CALLBACKS["banner_position_END"] in current
+    assert "banner_position_menu" not in _LEGACY_CALLBACKS
+    
+    return "All keyboard layouts functional"
+
+async def test_file_processor():
+    """FileProcessor can be created for a user"""
+    from utils.file_processor import FileProcessor
+    
+    processor = FileProcessor(12345)
+    
+    # Test template application
+    template = "{title} S{season}E{episode}"
+    variables = {
+        'title': 'Test Show',
+        'season': '01',
+        'episode': '01'
+    }
+    
+    # Mock file object for testing
+    class MockFile:
+        def __init__(self):
+            self.file_name = "test_file.mp4"
+            self.file_size = 1000000
+    
+    mock_file = MockFile()
+    
+    # Variables extracted from the file name
+    mock_file.file_name = "Show.S02E07.720p.[Group].mkv"
+    extracted = processor._extract_variables_from_file(mock_file)
+    assert (extracted['season'], extracted['episode'], extracted['quality']) == ('02', '07', '720p')
+    assert extracted['title'] == "Show.S02E07.720p."
+    
+    # Brackets are removed before parentheses, also when the pairs interleave
+    mock_file.file_name = "Show (a[b) c].mkv"
+    assert processor._extract_variables_from_file(mock_file)['title'] == "Show (a"
+    
+    # Replacement rules apply in order and cascade
+    from utils.file_processor import _replace_all
+    assert _replace_all("abc.mkv", {"a": "b", "b": "c"}) == "ccc.mkv"
+    assert _replace_all("hello", {"l": "L", "ll": "X"}) == "heLLo"
+    
+    # A failure after the download removes the downloaded file
+    from config import download_path
+    class MockAttachment(MockFile):
+        file_unique_id = "cleanup-check"
+        async def get_file(self):
+            return self
+        async def download_to_drive(self, path):
+            Path(path).write_bytes(b"data")
+    class MockStorage:
+        def get_user_settings(self):
+            return {'rename_mode': 'autorename'}
+    def failing_generate(*args):
+        raise RuntimeError("rename failed")
+    processor.storage = MockStorage()
+    processor._generate_filename = failing_generate
+    result = await processor.process_file(MockAttachment())
+    assert result == {"success": False, "error": "rename failed"}
+    assert not (download_path() / "12345_cleanup-check").exists()
+    return "File processor initialized"
+
+async def test_configuration():
+    """Required configuration values exist"""
+    import config
+    
+    # Test default config values
+    assert hasattr(config, 'BOT_TOKEN')
+    assert hasattr(config, 'ADMIN_IDS')
+    assert hasattr(config, 'MAX_FILE_SIZE')
+    return "Configuration loaded"
+
+# Independent checks, run concurrently once the imports succeed
+COMPONENT_TESTS = [
+    ("Template Engine", test_template_engine),
+    ("Banner Manager", test_banner_manager),
+    ("Storage System", test_storage),
+    ("Keyboard Layouts", test_keyboards),
+    ("File Processor", test_file_processor),
+    ("Configuration", test_configuration),
+]
+
 async def test_bot_components():
     """Test all bot components"""
     
@@ -28,7 +285,7 @@ async def test_bot_components():
         from bot.main import AutoRenamerBot
         from bot import handlers
         from bot import keyboards
-        from bot.storage import UserStorage, GlobalStorage
+        from bot.storage import UserStorage, GlobalStorage, flush_pending_settings
         from utils.file_processor import FileProcessor
         from utils.template_engine import TemplateEngine
         from utils.banner_manager import BannerManager
@@ -38,127 +295,21 @@ async def test_bot_components():
         print(f"   ❌ Import error: {e}")
         return False
     
-    # Test 2: Template Engine
-    print("2. Testing Template Engine...")
-    try:
-        engine = TemplateEngine()
-        template = "S{season} E{episode} - {title} [{audio}] {quality}"
-        variables = {
-            'season': '01',
-            'episode': '05', 
-            'title': 'Sample Movie',
-            'audio': 'AAC',
-            'quality': '1080p'
-        }
-        result = engine.apply_template(template, variables)
-        expected = "S01 E05 - Sample Movie [AAC] 1080p"
-        assert result == expected, f"Expected '{expected}', got '{result}'"
-        print(f"   ✅ Template processing: {result}")
-    except Exception as e:
-        print(f"   ❌ Template engine error: {e}")
-        return False
-    
-    # Test 3: Banner Manager
-    print("3. Testing Banner Manager...")
-    try:
-        banner_mgr = BannerManager()
-        positions = banner_mgr.get_banner_positions()
-        assert 'START' in positions
-        assert 'END' in positions
-        assert 'BOTH' in positions
-        assert 'DISABLED' in positions
-        
-        # Test banner creation
-        banner_data = banner_mgr.create_banner("Test Banner", "https://example.com")
-        assert len(banner_data) > 0, "Banner data should not be empty"
-        print("   ✅ Banner management functional")
-    except Exception as e:
-        print(f"   ❌ Banner manager error: {e}")
-        return False
+    results = await asyncio.gather(
+        *(test() for _, test in COMPONENT_TESTS), return_exceptions=True
+    )
     
-    # Test 4: Storage System
-    print("4. Testing Storage System...")
-    try:
-        # Test user storage
-        user_storage = UserStorage(12345)
-        user_storage.initialize_user(12345, "Test User", "testuser")
-        
-        # Test settings
-        user_storage.set_setting("rename_mode", "AUTO")
-        user_storage.set_setting("caption_mode", "BOLD")
-        user_storage.set_setting("banner_position", "START")
-        
-        settings = user_storage.get_user_settings()
-        assert settings['rename_mode'] == 'AUTO'
-        assert settings['caption_mode'] == 'BOLD'
-        assert settings['banner_position'] == 'START'
-        
-        # Test global storage
-        global_storage = GlobalStorage()
-        stats = global_storage.get_total_stats()
-        assert isinstance(stats, dict)
-        
-        print("   ✅ Storage system functional")
-    except Exception as e:
-        print(f"   ❌ Storage system error: {e}")
-        return False
-    
-    # Test 5: Keyboard Layouts
-    print("5. Testing Keyboard Layouts...")
-    try:
-        keyboard_funcs = [
-            keyboards.get_main_menu_keyboard,
-            keyboards.get_rename_settings_keyboard,
-            keyboards.get_banner_keyboard,
-            keyboards.get_premium_keyboard,
-            keyboards.get_caption_mode_keyboard
-        ]
-        
-        for func in keyboard_funcs:
-            keyboard = func()
-            assert hasattr(keyboard, 'inline_keyboard')
-            assert len(keyboard.inline_keyboard) > 0
-        
-        print("   ✅ All keyboard layouts functional")
-    except Exception as e:
-        print(f"   ❌ Keyboard layout error: {e}")
-        return False
-    
-    # Test 6: File Processor
-    print("6. Testing File Processor...")
-    try:
-        processor = FileProcessor(12345)
-        
-        # Test template application
-        template = "{title} S{season}E{episode}"
-        variables = {
-            'title': 'Test Show',
-            'season': '01',
-            'episode': '01'
-        }
-        
-        # Mock file object for testing
-        class MockFile:
-            def __init__(self):
-                self.file_name = "test_file.mp4"
-                self.file_size = 1000000
-        
-        mock_file = MockFile()
-        print("   ✅ File processor initialized")
-    except Exception as e:
-        print(f"   ❌ File processor error: {e}")
-        return False
+    # Report in the original order regardless of completion order
+    success = True
+    for number, ((name, _), result) in enumerate(zip(COMPONENT_TESTS, results), start=2):
+        print(f"{number}. Testing {name}...")
+        if isinstance(result, Exception):
+            print(f"   ❌ {name} error: {result}")
+            success = False
+        else:
+            print(f"   ✅ {result}")
     
-    # Test 7: Configuration
-    print("7. Testing Configuration...")
-    try:
-        # Test default config values
-        assert hasattr(config, 'BOT_TOKEN')
-        assert hasattr(config, 'ADMIN_IDS')
-        assert hasattr(config, 'MAX_FILE_SIZE')
-        print("   ✅ Configuration loaded")
-    except Exception as e:
-        print(f"   ❌ Configuration error: {e}")
+    if not success:
         return False
     
     print("\n🎉 All tests passed! Bot is ready for deployment.")
@@ -4,76 +4,138 @@ Handles banner embedding with position control (START/END/BOTH/DISABLED)
 """
 
 import os
+import shutil
+from collections import OrderedDict
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from PIL import Image, ImageDraw, ImageFont
 import io
 
+from config import BANNER_POSITION_SET
+
 class BannerManager:
     """Manages banner creation and embedding for documents"""
     
+    # Rendered banners kept per manager, least recently used dropped first
+    MAX_CACHED_BANNERS = 128
+    
+    # Fonts by (name, size), shared by all managers
+    _fonts: Dict[Tuple[str, int], Any] = {}
+    
+    # Text extents by (text, font name, font size); reset once it reaches the limit
+    MAX_CACHED_LAYOUTS = 1024
+    _layout_cache: Dict[Tuple[str, str, int], Tuple[int, int]] = {}
+    
+    # White canvases by (width, height), copied for each new banner; reset once it reaches the limit
+    MAX_CACHED_BLANKS = 16
+    _blanks: Dict[Tuple[int, int], Image.Image] = {}
+    
+    TITLE_FONT = ("arial.ttf", 24)
+    LINK_FONT = ("arial.ttf", 16)
+    
     def __init__(self):
-        self.banner_cache = {}
+        self.banner_cache: "OrderedDict[Tuple[str, str, int, int, str], bytes]" = OrderedDict()
+        
+        # Try to use a decent font, fallback to default
+        self.font = self._get_font(*self.TITLE_FONT)
+        self.small_font = self._get_font(*self.LINK_FONT)
     
-    def create_banner(self, text: str, link: str = "", width: int = 800, height: int = 100) -> bytes:
-        """Create a banner image with text and optional link"""
-        try:
-            # Create image with white background
-            img = Image.new('RGB', (width, height), 'white')
-            draw = ImageDraw.Draw(img)
-            
-            # Try to use a decent font, fallback to default
+    @classmethod
+    def _get_font(cls, name: str, size: int):
+        """Load a TrueType font once, falling back to PIL's default"""
+        key = (name, size)
+        font = cls._fonts.get(key)
+        if font is None:
             try:
-                font = ImageFont.truetype("arial.ttf", 24)
-                small_font = ImageFont.truetype("arial.ttf", 16)
-            except:
+                font = ImageFont.truetype(name, size)
+            except (OSError, ImportError):
                 font = ImageFont.load_default()
-                small_font = ImageFont.load_default()
+            cls._fonts[key] = font
+        return font
+    
+    @classmethod
+    def _measure(cls, draw: ImageDraw.ImageDraw, text: str, font_key: Tuple[str, int]) -> Tuple[int, int]:
+        """Width and height of text in the given font, measured once per text"""
+        key = (text, *font_key)
+        size = cls._layout_cache.get(key)
+        if size is None:
+            bbox = draw.textbbox((0, 0), text, font=cls._get_font(*font_key))
+            size = (bbox[2] - bbox[0], bbox[3] - bbox[1])
+            if len(cls._layout_cache) >= cls.MAX_CACHED_LAYOUTS:
+                cls._layout_cache.clear()
+            cls._layout_cache[key] = size
+        return size
+    
+    def create_banner(self, text: str, link: str = "", width: int = 800, height: int = 100,
+                      image_format: str = "JPEG") -> bytes:
+        """Create a banner image with text and optional link (JPEG, or PNG when requested)"""
+        key = (text, link, width, height, image_format)
+        cached = self.banner_cache.get(key)
+        if cached is not None:
+            self.banner_cache.move_to_end(key)
+            return cached
+        
+        try:
+            # Create image with white background (a copy of a cached blank skips the fill)
+            blank = self._blanks.get((width, height))
+            if blank is None:
+                if len(self._blanks) >= self.MAX_CACHED_BLANKS:
+                    self._blanks.clear()
+                blank = self._blanks[(width, height)] = Image.new('RGB', (width, height), 'white')
+            img = blank.copy()
+            draw = ImageDraw.Draw(img)
             
             # Draw main text
-            text_bbox = draw.textbbox((0, 0), text, font=font)
-            text_width = text_bbox[2] - text_bbox[0]
-            text_height = text_bbox[3] - text_bbox[1]
+            text_width, text_height = self._measure(draw, text, self.TITLE_FONT)
             
             text_x = (width - text_width) // 2
             text_y = (height - text_height) // 2 - 10
             
-            draw.text((text_x, text_y), text, fill='black', font=font)
+            draw.text((text_x, text_y), text, fill='black', font=self.font)
             
             # Draw link if provided
             if link:
                 link_text = f"🔗 {link}"
-                link_bbox = draw.textbbox((0, 0), link_text, font=small_font)
-                link_width = link_bbox[2] - link_bbox[0]
+                link_width, _ = self._measure(draw, link_text, self.LINK_FONT)
                 link_x = (width - link_width) // 2
                 link_y = text_y + text_height + 5
                 
-                draw.text((link_x, link_y), link_text, fill='blue', font=small_font)
+                draw.text((link_x, link_y), link_text, fill='blue', font=self.small_font)
             
             # Convert to bytes
             buffer = io.BytesIO()
-            img.save(buffer, format='PNG')
-            return buffer.getvalue()
+            if image_format == 'PNG':
+                # Mostly blank banners barely shrink past level 1, so skip the slower deflate levels
+                img.save(buffer, format='PNG', compress_level=1, optimize=False)
+            else:
+                # Banners are opaque, so JPEG avoids PNG's filter and deflate passes entirely
+                img.save(buffer, format='JPEG', quality=85, optimize=False, subsampling=2)
+            banner = buffer.getvalue()
+            
+            self.banner_cache[key] = banner
+            if len(self.banner_cache) > self.MAX_CACHED_BANNERS:
+                self.banner_cache.popitem(last=False)
+            return banner
             
         except Exception as e:
             print(f"Banner creation error: {e}")
             return b""
     
     def embed_banner_in_pdf(self, pdf_path: str, banner_data: bytes, position: str, link: str = "") -> str:
-        """Embed banner in PDF file at specified position"""
+        """Embed banner (JPEG or PNG bytes) in PDF file at specified position"""
+        # Nothing to embed, so the original file is used as is
+        if position == 'DISABLED' or not banner_data:
+            return pdf_path
+        
         try:
             # This would use a PDF library like PyPDF2 or reportlab in a real implementation
             # For now, we'll simulate the process
             
             output_path = pdf_path.replace('.pdf', '_with_banner.pdf')
             
-            # Simulate banner embedding
-            with open(pdf_path, 'rb') as src:
-                content = src.read()
-            
-            # Write modified content (in reality, this would properly embed the banner)
-            with open(output_path, 'wb') as dst:
-                dst.write(content)
+            # Simulate banner embedding with a kernel-side copy instead of reading the PDF into memory
+            # (in reality, this would properly embed the banner)
+            shutil.copyfile(pdf_path, output_path)
             
             return output_path
             
@@ -99,7 +161,7 @@ class BannerManager:
                 errors.append("Banner image is required when banner is enabled")
             
             position = settings.get('banner_position', 'START')
-            if position not in ['START', 'END', 'BOTH', 'DISABLED']:
+            if position not in BANNER_POSITION_SET:
                 errors.append("Invalid banner position")
         
         return {
@@ -5,15 +5,71 @@ Handles file downloads, renaming, and processing with progress tracking
 
 import os
 import asyncio
+import errno
+import re
 import shutil
+import uuid
 from pathlib import Path
 from typing import Dict, Any, Optional
+
+import aiofiles
+import aiofiles.os
 from telegram import File
 
 from config import *
 from bot.storage import get_user_storage
 from utils.template_engine import TemplateEngine
 
+def _move_to_unique_path(source: Path, directory: Path, name: str) -> Path:
+    """Move source into directory as name, or name with a random suffix if that is taken"""
+    target = directory / name
+    try:
+        # O_EXCL claims the name atomically, so concurrent renames cannot overwrite each other
+        fd = os.open(target, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        stem, dot, extension = name.rpartition('.')
+        unique_name = f"{stem}_{uuid.uuid4().hex[:8]}.{extension}" if dot else f"{name}_{uuid.uuid4().hex[:8]}"
+        target = directory / unique_name
+        fd = os.open(target, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    os.close(fd)
+    
+    try:
+        # Same filesystem: a single rename over the claimed placeholder
+        os.replace(source, target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            os.remove(target)
+            raise
+        shutil.move(source, target)
+    return target
+
+# Run in aiofiles' thread pool so a cross-device copy never stalls the loop
+_move_file = aiofiles.os.wrap(_move_to_unique_path)
+
+# Filename patterns for _extract_variables_from_file, compiled once.
+# Qualities are listed from highest to lowest; the highest one present wins.
+_QUALITY_PRIORITY = ('2160p', '1440p', '1080p', '720p', '480p', '360p', '240p', '144p')
+_QUALITY_RANK = {quality: rank for rank, quality in enumerate(_QUALITY_PRIORITY)}
+_QUALITY_RE = re.compile('|'.join(_QUALITY_PRIORITY), re.IGNORECASE)
+_SEASON_EPISODE_RE = re.compile(r's(\d+)e(\d+)', re.IGNORECASE)  # S01E01, s01e01, etc.
+# Stripped from titles in lower or upper case (not mixed), wherever they appear
+_TITLE_EXTENSIONS = ('.mkv', '.mp4', '.avi', '.mov', '.wmv', '.flv')
+_EXTENSION_RE = re.compile('|'.join(
+    re.escape(extension) for ext in _TITLE_EXTENSIONS for extension in (ext, ext.upper())
+))
+_BRACKETS_RE = re.compile(r'\[.*?\]')
+_PARENTHESES_RE = re.compile(r'\(.*?\)')
+
+# _sanitize_filename: invalid characters become underscores, runs of underscores collapse
+_INVALID_CHARS_TABLE = str.maketrans(dict.fromkeys('<>:"/\\|?*', '_'))
+_UNDERSCORES_RE = re.compile(r'_{2,}')
+
+def _replace_all(text: str, replace_rules: Dict[str, str]) -> str:
+    """Apply replacement rules in the order they were added, each seeing the previous results"""
+    for old_text, new_text in replace_rules.items():
+        text = text.replace(old_text, new_text)
+    return text
+
 class FileProcessor:
     """Handles file processing operations"""
     
@@ -24,9 +80,11 @@ class FileProcessor:
         
     async def process_file(self, file_obj: File, caption: str = "") -> Dict[str, Any]:
         """Process a file for renaming"""
+        file_path = output_path = None
+        succeeded = False
         try:
-            # Get user settings
-            settings = self.storage.get_user_settings()
+            # Get user settings (SQLite access runs in a worker thread)
+            settings = await asyncio.to_thread(self.storage.get_user_settings)
             
             # Download file
             file_path = await self._download_file(file_obj)
@@ -43,14 +101,9 @@ class FileProcessor:
             output_path = await self._rename_file(file_path, new_name)
             
             # Update user statistics
-            self.storage.increment_files_processed()
-            
-            # Clean up original file
-            try:
-                os.remove(file_path)
-            except:
-                pass
+            await asyncio.to_thread(self.storage.increment_files_processed)
             
+            succeeded = True
             return {
                 "success": True,
                 "new_name": new_name,
@@ -60,24 +113,39 @@ class FileProcessor:
             
         except Exception as e:
             return {"success": False, "error": str(e)}
+        
+        finally:
+            if not succeeded:
+                # Don't leave the download or the renamed file behind, also on timeout
+                for path in (file_path, output_path):
+                    if path:
+                        try:
+                            await aiofiles.os.remove(path)
+                        except OSError:
+                            pass
     
     async def _download_file(self, file_obj: File) -> Optional[str]:
         """Download file from Telegram"""
         try:
-            # Create download path if it doesn't exist
-            DOWNLOAD_PATH.mkdir(exist_ok=True)
-            
             # Generate unique filename for temporary storage
             temp_name = f"{self.user_id}_{file_obj.file_unique_id}"
-            file_path = DOWNLOAD_PATH / temp_name
+            file_path = download_path() / temp_name
             
-            # Download file (in a real implementation, this would use the Telegram Bot API)
-            # For now, we'll simulate the download
-            # file_obj.download(file_path)
+            # Attachments (documents, videos, ...) resolve to a File carrying the download URL
+            if not isinstance(file_obj, File):
+                file_obj = await file_obj.get_file()
             
-            # Create a dummy file for demonstration
-            with open(file_path, 'wb') as f:
-                f.write(b"dummy file content")
+            # PTB's download honours the bot's request settings and local Bot API mode;
+            # concurrent downloads are already bounded by the file handler's semaphore
+            try:
+                await file_obj.download_to_drive(file_path)
+            except BaseException:
+                # Don't leave a partial download behind
+                try:
+                    await aiofiles.os.remove(file_path)
+                except OSError:
+                    pass
+                raise
             
             return str(file_path)
             
@@ -144,11 +212,7 @@ class FileProcessor:
         original_name = getattr(file_obj, 'file_name', f"file_{file_obj.file_unique_id}")
         replace_rules = settings.get('replace_rules', {})
         
-        new_name = original_name
-        for old_text, new_text in replace_rules.items():
-            new_name = new_name.replace(old_text, new_text)
-        
-        return new_name
+        return _replace_all(original_name, replace_rules)
     
     def _extract_variables_from_file(self, file_obj: File) -> Dict[str, str]:
         """Extract template variables from file information"""
@@ -169,34 +233,24 @@ class FileProcessor:
         }
         
         if filename:
-            # Try to extract information from filename
-            filename_lower = filename.lower()
-            
             # Extract quality
-            for quality in ['2160p', '1440p', '1080p', '720p', '480p', '360p', '240p', '144p']:
-                if quality in filename_lower:
-                    variables['quality'] = quality
-                    break
+            qualities = _QUALITY_RE.findall(filename)
+            if qualities:
+                variables['quality'] = min(
+                    (quality.lower() for quality in qualities), key=_QUALITY_RANK.__getitem__
+                )
             
             # Extract season/episode patterns
-            import re
-            
-            # Pattern: S01E01, s01e01, etc.
-            se_pattern = r's(\d+)e(\d+)'
-            match = re.search(se_pattern, filename_lower)
+            match = _SEASON_EPISODE_RE.search(filename)
             if match:
                 variables['season'] = match.group(1).zfill(2)
                 variables['episode'] = match.group(2).zfill(2)
             
-            # Extract title (remove extensions and common patterns)
-            title = filename
-            for ext in ['.mkv', '.mp4', '.avi', '.mov', '.wmv', '.flv']:
-                title = title.replace(ext, '').replace(ext.upper(), '')
-            
-            # Clean title
-            title = re.sub(r'\[.*?\]', '', title)  # Remove brackets
-            title = re.sub(r'\(.*?\)', '', title)  # Remove parentheses
-            title = title.strip()
+            # Extract title (remove extensions, bracketed and parenthesized parts)
+            title = _EXTENSION_RE.sub('', filename)
+            # Brackets first, then parentheses, so interleaved pairs resolve as before
+            title = _BRACKETS_RE.sub('', title)
+            title = _PARENTHESES_RE.sub('', title).strip()
             
             if title:
                 variables['title'] = title
@@ -205,46 +259,23 @@ class FileProcessor:
     
     def _apply_replacements(self, filename: str, replace_rules: Dict[str, str]) -> str:
         """Apply text replacement rules"""
-        for old_text, new_text in replace_rules.items():
-            filename = filename.replace(old_text, new_text)
-        return filename
+        return _replace_all(filename, replace_rules)
     
     def _sanitize_filename(self, filename: str) -> str:
         """Sanitize filename by removing invalid characters"""
-        invalid_chars = '<>:"/\\|?*'
-        for char in invalid_chars:
-            filename = filename.replace(char, '_')
-        
-        # Remove multiple underscores
-        while '__' in filename:
-            filename = filename.replace('__', '_')
+        filename = _UNDERSCORES_RE.sub('_', filename.translate(_INVALID_CHARS_TABLE))
         
         # Trim and limit length
-        filename = filename.strip('_').strip()
-        if len(filename) > 200:
-            filename = filename[:200]
+        filename = filename.strip('_').strip()[:200]
         
         return filename or "renamed_file"
     
     async def _rename_file(self, original_path: str, new_name: str) -> str:
         """Rename file and return new path"""
         original_path_obj = Path(original_path)
-        new_path = original_path_obj.parent / new_name
-        
-        # Ensure unique filename
-        counter = 1
-        while new_path.exists():
-            name_parts = new_name.rsplit('.', 1)
-            if len(name_parts) == 2:
-                new_name_with_counter = f"{name_parts[0]}_{counter}.{name_parts[1]}"
-            else:
-                new_name_with_counter = f"{new_name}_{counter}"
-            
-            new_path = original_path_obj.parent / new_name_with_counter
-            counter += 1
         
-        # Rename file
-        shutil.move(original_path, new_path)
+        # Downloads and renamed files share a directory, so this is normally one os.replace
+        new_path = await _move_file(original_path_obj, original_path_obj.parent, new_name)
         
         return str(new_path)
     
@@ -4,28 +4,64 @@ Handles variable substitution and template processing
 """
 
 import re
-from typing import Dict, List, Any
+from functools import lru_cache
+from typing import Callable, Dict, List, Any
+
+# Filename cleanup tables, built once
+_WHITESPACE_RE = re.compile(r'\s+')
+_UNDERSCORES_RE = re.compile(r'_{2,}')
+_INVALID_CHARS_TABLE = str.maketrans(dict.fromkeys('<>:"/\\|?*', '_'))
+
+# Allowed variable names for validate_template
+_VARIABLE_NAME_RE = re.compile(r'[a-zA-Z_][a-zA-Z0-9_]*')
+
+# {name} placeholders in rename templates
+_VARIABLE_PATTERN = re.compile(r'\{([^}]+)\}')
+
+# Placeholders substituted by _compile_template; a name holds no brace, so a stray
+# or doubled "{" before a placeholder stays literal text instead of joining it
+_PLACEHOLDER_RE = re.compile(r'\{([^{}]+)\}')
+
+@lru_cache(maxsize=1024)
+def _compile_template(template: str) -> Callable[[Dict[str, Any]], str]:
+    """Parse a template once into literal text and variable names, returning its renderer"""
+    # split() alternates literal text and placeholder names, starting and ending with text
+    parts = _PLACEHOLDER_RE.split(template)
+    first, literals, names = parts[0], parts[2::2], parts[1::2]
+    placeholders = [f"{{{name}}}" for name in names]
+    
+    def render(variables: Dict[str, Any]) -> str:
+        # Unknown variables keep their placeholder until the cleanup below
+        out = [first]
+        for name, placeholder, literal in zip(names, placeholders, literals):
+            out.append(str(variables[name]) if name in variables else placeholder)
+            out.append(literal)
+        result = ''.join(out)
+        
+        # Leftover {...}, from unknown variables or inside values, is dropped as it
+        # always was; unmatched braces stay
+        if '{' in result:
+            result = _VARIABLE_PATTERN.sub('', result)
+        return result
+    
+    return render
 
 class TemplateEngine:
     """Template processing engine for file renaming"""
     
     def __init__(self):
-        self.variable_pattern = re.compile(r'\{([^}]+)\}')
+        self.variable_pattern = _VARIABLE_PATTERN
+    
+    def compile(self, template: str) -> Callable[[Dict[str, Any]], str]:
+        """Renderer for template; users reuse one template, so it is parsed only once"""
+        return _compile_template(template)
     
     def apply_template(self, template: str, variables: Dict[str, str]) -> str:
         """Apply variables to template string"""
         if not template:
             return "renamed_file"
         
-        result = template
-        
-        # Replace all variables in the template
-        for var_name, var_value in variables.items():
-            placeholder = f"{{{var_name}}}"
-            result = result.replace(placeholder, str(var_value))
-        
-        # Clean up any remaining unreplaced variables
-        result = self.variable_pattern.sub('', result)
+        result = _compile_template(template)(variables)
         
         # Clean up the result
         result = self._clean_filename(result)
@@ -43,41 +79,30 @@ class TemplateEngine:
             return {"valid": False, "error": "Empty template"}
         
         # Check for balanced braces
-        open_braces = template.count('{')
-        close_braces = template.count('}')
-        
-        if open_braces != close_braces:
+        if template.count('{') != template.count('}'):
             return {"valid": False, "error": "Unbalanced braces"}
         
-        # Extract variables
-        variables = self.extract_variables(template)
-        
-        # Check for invalid characters in variable names
+        # Extract variables, then check for invalid characters in their names
+        variables = dict.fromkeys(self.variable_pattern.findall(template))
         for var in variables:
-            if not re.match(r'^[a-zA-Z_][a-zA-Z0-9_]*$', var):
+            if not _VARIABLE_NAME_RE.fullmatch(var):
                 return {"valid": False, "error": f"Invalid variable name: {var}"}
         
-        return {"valid": True, "variables": variables}
+        return {"valid": True, "variables": list(variables)}
     
     def _clean_filename(self, filename: str) -> str:
         """Clean and sanitize filename"""
         # Remove multiple spaces
-        filename = re.sub(r'\s+', ' ', filename)
+        filename = _WHITESPACE_RE.sub(' ', filename)
         
         # Remove leading/trailing spaces and dashes
         filename = filename.strip(' -_')
         
         # Replace invalid filename characters (but preserve hyphens for normal use)
-        invalid_chars = '<>:"/\\|?*'
-        for char in invalid_chars:
-            filename = filename.replace(char, '_')
-        
-        # Remove multiple underscores but keep single ones and hyphens
-        filename = re.sub(r'_{2,}', '_', filename)
+        filename = filename.translate(_INVALID_CHARS_TABLE)
         
-        # Limit length
-        if len(filename) > 200:
-            filename = filename[:200]
+        # Remove multiple underscores but keep single ones and hyphens, then limit length
+        filename = _UNDERSCORES_RE.sub('_', filename)[:200]
         
         return filename
     